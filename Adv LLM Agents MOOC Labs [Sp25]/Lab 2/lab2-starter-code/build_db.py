@@ -1,12 +1,22 @@
 # build_db.py
+from src.context_packs import build_context_packs
 from src.embedding_db import VectorDB
-from src.embedding_models import MiniEmbeddingModel
+from src.embedding_models import get_default_embedding_model
 
 if __name__ == "__main__":
     print("Building RAG database from 'documents/' folder...")
+    embedding_model = get_default_embedding_model()
     VectorDB(
         directory="documents",
         vector_file="database.npy",
-        embedding_model=MiniEmbeddingModel()
+        embedding_model=embedding_model
     )
-    print("Database built: database.npy + database_chunks.pkl")
\ No newline at end of file
+    print("Database built: database.npy + database_chunks.pkl")
+
+    print("Building context packs for the task families in 'tasks/'...")
+    build_context_packs(
+        tasks_dir="tasks",
+        vector_file="database.npy",
+        embedding_model=embedding_model
+    )
+    print("Context packs built: context_packs.json")
@@ -1,22 +1,145 @@
 # src/agents.py
-from groq import Groq
+import json
 import os
+import threading
+import time
+from typing import Dict, List, Optional
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from src.tracing import span
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Groq client shared by all agents, created (and groq imported) on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from groq import Groq
+                _client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    return _client
 
 class LLM_Agent:
     def __init__(self, model="llama-3.3-70b-versatile"):
         self.model = model
 
     def get_response(self, messages, temperature=0.7, max_tokens=2048):
-        response = client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_p=0.9
-        )
+        with span("llm_request", model=self.model, max_tokens=max_tokens):
+            response = get_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=0.9
+            )
         return response.choices[0].message.content
 
+# Cascade: cheapest model first, escalate after failed Lean checks.
+# CASCADE_MODELS="llama-3.3-70b-versatile" keeps the single strong model.
+DEFAULT_CASCADE = ("llama-3.1-8b-instant", "llama-3.3-70b-versatile")
+# Only a failed Lean check moves a task up a tier; API errors (rate limits)
+# and unparsable responses are retried on the same model.
+ESCALATING_STAGES = ("impl", "proof")
+
+_routing_records: List[dict] = []
+_routing_lock = threading.Lock()
+
+def cascade_from_env() -> List[str]:
+    models = os.getenv("CASCADE_MODELS")
+    return [m.strip() for m in models.split(",") if m.strip()] if models else list(DEFAULT_CASCADE)
+
 class Generation_Agent(LLM_Agent):
-    pass  # We only need one strong model
\ No newline at end of file
+    """
+    LLM_Agent that routes through a model cascade for one task.
+
+    get_response() uses the current tier; the caller reports each attempt's
+    Lean check with record_attempt(ok, stage). After escalate_after failed
+    Lean checks ("impl" or "proof") on a tier the agent moves to the next
+    (larger) model and stays on the last one; "api" and "format" failures
+    retry on the same tier. Every attempt is recorded for routing_stats().
+    """
+    def __init__(self, models: Optional[List[str]] = None, escalate_after: Optional[int] = None, task: str = ""):
+        self.models = list(models) if models else cascade_from_env()
+        super().__init__(self.models[0])
+        self.escalate_after = escalate_after or int(os.getenv("CASCADE_ESCALATE_AFTER", "1"))
+        self.task = task
+        self.tier = 0
+        self._tier_failures = 0
+        self._started = None
+        self._record = {"task": task, "attempts": [], "solved_by": None}
+        with _routing_lock:
+            _routing_records.append(self._record)
+
+    def get_response(self, messages, temperature=0.7, max_tokens=2048):
+        self._started = time.perf_counter()
+        return super().get_response(messages, temperature=temperature, max_tokens=max_tokens)
+
+    def record_attempt(self, ok: bool, stage: str = ""):
+        """Report the outcome of the last response ("format", "impl", "proof", "api" or "" on success)."""
+        elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        self._started = None
+        with _routing_lock:
+            self._record["attempts"].append({"model": self.model, "ok": ok, "stage": stage,
+                                             "latency_s": round(elapsed, 3)})
+            if ok:
+                self._record["solved_by"] = self.model
+        if ok or stage not in ESCALATING_STAGES:
+            return
+        self._tier_failures += 1
+        if self._tier_failures >= self.escalate_after and self.tier + 1 < len(self.models):
+            self.tier += 1
+            self._tier_failures = 0
+            self.model = self.models[self.tier]
+            print(f"[Cascade] {self.task or 'task'}: escalating to {self.model} after a failed {stage} check")
+
+def routing_stats() -> Dict[str, dict]:
+    """
+    Per-model routing summary over every task in this process.
+
+    Returns:
+        Dict[str, dict]: model -> attempts, failures by stage ("impl",
+        "proof", "format"), api_errors, tasks solved, mean LLM latency; plus "_tasks" with solved / escalated / unsolved counts
+    """
+    with _routing_lock:
+        records = [dict(r, attempts=list(r["attempts"])) for r in _routing_records]
+    summary: Dict[str, dict] = {}
+    for record in records:
+        for attempt in record["attempts"]:
+            s = summary.setdefault(attempt["model"], {"attempts": 0, "failures": {}, "api_errors": 0,
+                                                      "solved": 0, "latency_s": 0.0})
+            s["attempts"] += 1
+            s["latency_s"] += attempt["latency_s"]
+            if attempt["stage"] == "api":
+                s["api_errors"] += 1
+            elif not attempt["ok"]:
+                s["failures"][attempt["stage"]] = s["failures"].get(attempt["stage"], 0) + 1
+        if record["solved_by"]:
+            summary[record["solved_by"]]["solved"] += 1
+    for s in summary.values():
+        s["mean_latency_s"] = round(s.pop("latency_s") / s["attempts"], 3) if s["attempts"] else 0.0
+    summary["_tasks"] = {
+        "total": len(records),
+        "solved": sum(1 for r in records if r["solved_by"]),
+        "escalated": sum(1 for r in records if len({a["model"] for a in r["attempts"]}) > 1),
+    }
+    return summary
+
+def print_routing_stats():
+    summary = routing_stats()
+    tasks = summary.pop("_tasks")
+    if not tasks["total"]:
+        return
+    print(f"[Cascade] {tasks['solved']}/{tasks['total']} tasks solved, {tasks['escalated']} escalated")
+    for model, s in summary.items():
+        failures = ", ".join(f"{stage or 'check'}: {n}" for stage, n in s["failures"].items()) or "none"
+        print(f"  {model}: {s['attempts']} attempts, solved {s['solved']}, "
+              f"mean latency {s['mean_latency_s']:.2f}s, failures ({failures}), API errors {s['api_errors']}")
+
+def export_routing_stats(path: str):
+    """Write the per-task routing records and the summary as JSON (for tuning the cascade)."""
+    with _routing_lock:
+        records = list(_routing_records)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"summary": routing_stats(), "tasks": records}, f, indent=2)
+    print(f"[Cascade] Routing stats saved to {path}")
\ No newline at end of file
@@ -0,0 +1,192 @@
+# src/context_packs.py
+"""
+Pre-built retrieval context packs, one per task family.
+
+Tasks whose signatures have the same shape (parameter types and return
+type, e.g. "(Int, Int) -> Int") tend to need the same Lean idioms. The
+offline stage (build_context_packs, run from build_db.py) groups tasks/* by
+that shape, retrieves the best chunks from the VectorDB for every task in a
+group, dedupes and ranks them, and writes one pack per family to
+context_packs.json.
+
+At prompt time, get_context_pack() is a dict lookup keyed by the shape of
+the template's `def` line: no embedding model is loaded and no similarity
+search runs for known families (numpy and the model are only imported by
+the offline build).
+"""
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+PACKS_FILE = "context_packs.json"
+
+_DEF_LINE = re.compile(r"^def\s+(\S+)\s*(.*?)\s*:\s*([^:=]+?)\s*:=", re.MULTILINE)
+_BINDER = re.compile(r"\(([^():]+):([^()]+)\)")
+_SPECIAL_TOKENS = re.compile(r"\[(?:CLS|SEP|PAD)\]")
+
+_packs_cache: Dict[str, Dict[str, dict]] = {}
+
+
+def family_key(param_types: List[str], return_type: str) -> str:
+    """Signature shape shared by a task family, e.g. "(Int, Int) -> Int"."""
+    normalize = lambda t: " ".join(t.split())
+    return f"({', '.join(normalize(t) for t in param_types)}) -> {normalize(return_type)}"
+
+
+def family_key_from_signature(signature: dict) -> str:
+    """Family key for a task's signature.json."""
+    return family_key([p["param_type"] for p in signature["parameters"]], signature["return_type"])
+
+
+def family_key_from_template(template: str) -> Optional[str]:
+    """
+    Family key parsed from the first `def` of a task.lean template, or None
+    if it has no recognizable definition. Grouped binders such as
+    `(a b : Int)` count once per name, as in signature.json.
+    """
+    match = _DEF_LINE.search(template)
+    if not match:
+        return None
+    param_types = []
+    for names, param_type in _BINDER.findall(match.group(2)):
+        param_types.extend([param_type.strip()] * len(names.split()))
+    return family_key(param_types, match.group(3))
+
+
+def clean_chunk(chunk: str) -> str:
+    """Strip tokenizer artifacts ([CLS]/[SEP]) and surrounding whitespace from a stored chunk."""
+    return _SPECIAL_TOKENS.sub("", chunk).strip()
+
+
+def load_task_families(tasks_dir: str = "tasks") -> Dict[str, List[dict]]:
+    """
+    Group the tasks in tasks_dir by signature shape.
+
+    Returns:
+        Dict[str, List[dict]]: family key -> tasks, each with its
+        task_id, signature and description.
+    """
+    families: Dict[str, List[dict]] = {}
+    for task_id in sorted(os.listdir(tasks_dir)):
+        signature_path = os.path.join(tasks_dir, task_id, "signature.json")
+        if not os.path.exists(signature_path):
+            continue
+        with open(signature_path, "r", encoding="utf-8") as f:
+            signature = json.load(f)
+        description = ""
+        description_path = os.path.join(tasks_dir, task_id, "description.txt")
+        if os.path.exists(description_path):
+            with open(description_path, "r", encoding="utf-8") as f:
+                description = f.read()
+        families.setdefault(family_key_from_signature(signature), []).append({
+            "task_id": task_id,
+            "signature": signature,
+            "description": description,
+        })
+    return families
+
+
+def build_context_packs(
+    tasks_dir: str = "tasks",
+    vector_file: str = "database.npy",
+    embedding_model=None,
+    output_file: str = PACKS_FILE,
+    k: int = 5,
+    max_snippets: int = 4,
+    max_chars: int = 4000,
+) -> Dict[str, dict]:
+    """
+    Offline stage: build one ranked, deduplicated context pack per task family.
+
+    Every task in a family queries the database with its signature and
+    description; a chunk's family score is its best score over those
+    queries. Chunks that are identical after whitespace normalization are
+    kept once.
+
+    Args:
+        tasks_dir: Folder with one sub-folder per task (signature.json, description.txt)
+        vector_file: VectorDB embeddings file (the chunks file sits next to it)
+        embedding_model: Model used to build the database (MiniEmbeddingModel by default)
+        output_file: Where to write the packs (JSON)
+        k: Chunks retrieved per task query
+        max_snippets: Snippets kept per pack
+        max_chars: Character budget per pack
+
+    Returns:
+        Dict[str, dict]: family key -> pack ({"family", "tasks", "snippets"})
+    """
+    import pickle
+
+    import numpy as np
+
+    if embedding_model is None:
+        from src.embedding_models import get_default_embedding_model
+        embedding_model = get_default_embedding_model()
+
+    embeddings = np.load(vector_file)
+    with open(os.path.splitext(vector_file)[0] + "_chunks.pkl", "rb") as f:
+        chunks = pickle.load(f)
+    norms = np.linalg.norm(embeddings, axis=1) + 1e-8
+
+    families = load_task_families(tasks_dir)
+    packs: Dict[str, dict] = {}
+    for key, tasks in families.items():
+        queries = [f"Lean 4 function {key}\n{task['description']}" for task in tasks]
+        query_vecs = np.atleast_2d(np.asarray(embedding_model.get_embeddings_batch(queries), dtype=float))
+        query_vecs /= np.linalg.norm(query_vecs, axis=1, keepdims=True) + 1e-8
+        # (n_queries, n_chunks) cosine similarities in one product
+        scores = (query_vecs @ embeddings.T) / norms
+
+        best: Dict[int, float] = {}
+        for row in scores:
+            for i in np.argsort(row)[-k:][::-1]:
+                best[int(i)] = max(best.get(int(i), -1.0), float(row[i]))
+
+        snippets, seen, used = [], set(), 0
+        for i, score in sorted(best.items(), key=lambda item: item[1], reverse=True):
+            text = clean_chunk(chunks[i])
+            fingerprint = " ".join(text.lower().split())
+            if not text or fingerprint in seen or used + len(text) > max_chars:
+                continue
+            seen.add(fingerprint)
+            snippets.append({"text": text, "score": round(score, 4)})
+            used += len(text)
+            if len(snippets) >= max_snippets:
+                break
+
+        packs[key] = {
+            "family": key,
+            "tasks": [task["task_id"] for task in tasks],
+            "snippets": snippets,
+        }
+        print(f"[ContextPacks] {key}: {len(tasks)} task(s), {len(snippets)} snippet(s)")
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(packs, f, indent=2, ensure_ascii=False)
+    print(f"[ContextPacks] Saved {len(packs)} pack(s) to {output_file}")
+    _packs_cache.pop(output_file, None)
+    return packs
+
+
+def load_context_packs(packs_file: str = PACKS_FILE) -> Dict[str, dict]:
+    """Load the packs once per process ({} if they have not been built)."""
+    packs = _packs_cache.get(packs_file)
+    if packs is None:
+        packs = {}
+        if os.path.exists(packs_file):
+            with open(packs_file, "r", encoding="utf-8") as f:
+                packs = json.load(f)
+        _packs_cache[packs_file] = packs
+    return packs
+
+
+def get_context_pack(template: str, packs_file: str = PACKS_FILE) -> Optional[dict]:
+    """Pack for the family of a task.lean template, or None for unknown families."""
+    key = family_key_from_template(template)
+    return load_context_packs(packs_file).get(key) if key else None
+
+
+def format_context_pack(pack: dict) -> str:
+    """Render a pack's snippets for the prompt."""
+    return "\n\n".join(f"-- Example {i}\n{s['text']}" for i, s in enumerate(pack["snippets"], 1))
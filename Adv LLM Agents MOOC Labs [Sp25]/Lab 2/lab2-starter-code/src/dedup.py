@@ -0,0 +1,157 @@
+# src/dedup.py
+"""
+Exact and near-duplicate chunk elimination for the index build.
+
+    kept, provenance, stats = dedup_chunks(chunks, sources, threshold=0.85)
+
+1. Exact: chunks whose normalized text (case and whitespace folded) hashes
+   the same are merged.
+2. Near: every remaining chunk gets a MinHash signature over its word
+   shingles; LSH banding proposes candidate pairs, and a pair is merged
+   when its estimated Jaccard similarity is at least `threshold`.
+
+The first chunk of each group is kept. provenance[i] lists every source
+merged into kept[i] (document, position, how it matched), so nothing is
+lost about where a chunk came from.
+"""
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SPECIAL_TOKENS = re.compile(r"\[(?:CLS|SEP|PAD)\]")
+
+
+def normalize_chunk(text: str) -> str:
+    """Text used for hashing: no tokenizer markers, lowercased, whitespace collapsed."""
+    return " ".join(_SPECIAL_TOKENS.sub(" ", text).lower().split())
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Word n-grams of the normalized text (the whole text if it is shorter than size words)."""
+    words = normalize_chunk(text).split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures with num_perm universal hash functions (deterministic for a seed)."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingle_set],
+            dtype=np.uint64,
+        )
+        # (len(shingles), num_perm) permuted hashes, min over shingles
+        permuted = ((hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is closest to the threshold.
+    """
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def dedup_chunks(
+    chunks: List[str],
+    sources: Optional[List[Tuple[str, int]]] = None,
+    threshold: float = 0.85,
+    num_perm: int = 128,
+    shingle_size: int = 5,
+) -> Tuple[List[str], List[List[dict]], Dict[str, int]]:
+    """
+    Drop exact and near-duplicate chunks, keeping the first of each group.
+
+    Args:
+        chunks: Chunk texts in build order
+        sources: (document, position) per chunk (defaults to ("", index))
+        threshold: Estimated Jaccard similarity of shingle sets to merge at (> 1 disables near dedup)
+        num_perm: MinHash permutations
+        shingle_size: Words per shingle
+
+    Returns:
+        Tuple: kept chunks, provenance per kept chunk (list of
+        {"document", "position", "match"} with match "original", "exact"
+        or "near"), and stats (input, kept, exact, near)
+    """
+    sources = sources or [("", i) for i in range(len(chunks))]
+    parent = list(range(len(chunks)))
+    match = ["original"] * len(chunks)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # 1. Exact duplicates
+    first_by_hash: Dict[str, int] = {}
+    unique: List[int] = []
+    for i, chunk in enumerate(chunks):
+        digest = hashlib.sha1(normalize_chunk(chunk).encode("utf-8")).hexdigest()
+        if digest in first_by_hash:
+            parent[i] = first_by_hash[digest]
+            match[i] = "exact"
+        else:
+            first_by_hash[digest] = i
+            unique.append(i)
+
+    # 2. Near duplicates among the exact-unique chunks
+    if threshold <= 1 and len(unique) > 1:
+        hasher = MinHasher(num_perm)
+        signatures = np.stack([hasher.signature(shingles(chunks[i], shingle_size)) for i in unique])
+        bands, rows = lsh_params(threshold, num_perm)
+        candidates = set()
+        for band in range(bands):
+            buckets: Dict[bytes, List[int]] = {}
+            for position, row in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+                buckets.setdefault(row.tobytes(), []).append(position)
+            for members in buckets.values():
+                for j in range(1, len(members)):
+                    candidates.add((members[0], members[j]))
+        for p, q in sorted(candidates):
+            similarity = float(np.mean(signatures[p] == signatures[q]))
+            root_p, root_q = find(unique[p]), find(unique[q])
+            if similarity >= threshold and root_p != root_q:
+                # keep the earlier chunk as the representative
+                keep, drop = min(root_p, root_q), max(root_p, root_q)
+                parent[drop] = keep
+                match[drop] = "near"
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(chunks)):
+        groups.setdefault(find(i), []).append(i)
+    kept, provenance = [], []
+    for root in sorted(groups):
+        kept.append(chunks[root])
+        provenance.append([
+            {"document": sources[i][0], "position": sources[i][1], "match": match[i]}
+            for i in groups[root]
+        ])
+    stats = {
+        "input": len(chunks),
+        "kept": len(kept),
+        "exact": match.count("exact"),
+        "near": len(chunks) - len(kept) - match.count("exact"),
+    }
+    return kept, provenance, stats
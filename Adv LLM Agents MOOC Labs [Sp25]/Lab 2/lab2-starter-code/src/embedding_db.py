@@ -1,11 +1,13 @@
 # src/embedding_db.py
 import os
+import json
 import numpy as np
-import requests
-from bs4 import BeautifulSoup
-import PyPDF2
-from src.embedding_models import BaseEmbeddingModel, MiniEmbeddingModel
+from typing import Optional
+from src.dedup import dedup_chunks
+from src.embedding_models import BaseEmbeddingModel, get_default_embedding_model
 import pickle
+from src.query_cache import invalidate_query_cache
+from src.tracing import span
 
 
 class VectorDB:
@@ -14,19 +16,31 @@ class VectorDB:
         directory: str = "documents",
         vector_file: str = "database.npy",
         max_words_per_chunk: int = 4000,
-        embedding_model: BaseEmbeddingModel = MiniEmbeddingModel()  # Local model only
+        embedding_model: Optional[BaseEmbeddingModel] = None,  # Local model only (shared MiniLM by default)
+        documents: Optional[list[str]] = None,
+        document_names: Optional[list[str]] = None,
+        dedup_threshold: Optional[float] = 0.85
     ):
         """
         Initializes the vector database using local embeddings (no OpenAI/Groq API needed).
+        The default embedding model is created on first use and shared process-wide.
+        With documents (e.g. texts returned by src.ingest.ingest_urls), the database is
+        rebuilt from them instead of loaded or read from the directory; document_names
+        (e.g. their URLs) label them in the provenance file (default document_<i>).
+        Exact and near-duplicate chunks (MinHash similarity >= dedup_threshold) are
+        embedded once; where the merged copies came from is saved to <stem>_sources.json.
+        None keeps every chunk.
         """
         self.directory = directory
         self.vector_file = vector_file
         self.chunks_file = os.path.splitext(vector_file)[0] + "_chunks.pkl"
+        self.sources_file = os.path.splitext(vector_file)[0] + "_sources.json"
+        self.document_names: list[str] = []
         self.max_words_per_chunk = max_words_per_chunk
-        self.embedding_model = embedding_model
+        self._embedding_model = embedding_model
 
         # Only build if embeddings don't already exist
-        if os.path.exists(self.vector_file) and os.path.exists(self.chunks_file):
+        if documents is None and os.path.exists(self.vector_file) and os.path.exists(self.chunks_file):
             print(f"[VectorDB] Loading existing embeddings from {self.vector_file}")
             self.embeddings = np.load(self.vector_file)
             with open(self.chunks_file, 'rb') as f:
@@ -34,14 +48,37 @@ class VectorDB:
             print(f"[VectorDB] Loaded {len(self.chunks)} pre-computed chunks and embeddings.")
             return
 
-        print(f"[VectorDB] Building new database from files in '{directory}/'")
-        docs = self.read_text_files()
+        if documents is not None:
+            print(f"[VectorDB] Building new database from {len(documents)} ingested document(s)")
+            docs = documents
+            self.document_names = list(document_names or [f"document_{i}" for i in range(len(documents))])
+            if len(self.document_names) != len(documents):
+                raise ValueError("document_names must have one name per document")
+        else:
+            print(f"[VectorDB] Building new database from files in '{directory}/'")
+            docs = self.read_text_files()
         if not docs:
             raise ValueError(f"No .txt files found in {directory}/")
 
-        self.chunks = self.embedding_model.split_documents(docs)
+        # Split per document so every chunk keeps its (document, position) origin
+        self.chunks, sources = [], []
+        for name, doc in zip(self.document_names, docs):
+            doc_chunks = self.embedding_model.split_documents([doc])
+            self.chunks.extend(doc_chunks)
+            sources.extend((name, position) for position in range(len(doc_chunks)))
         print(f"[VectorDB] Split into {len(self.chunks)} chunks")
 
+        with span("dedup", n=len(self.chunks)):
+            if dedup_threshold is not None:
+                self.chunks, provenance, stats = dedup_chunks(self.chunks, sources, threshold=dedup_threshold)
+                print(f"[VectorDB] Dedup kept {stats['kept']} of {stats['input']} chunks "
+                      f"({stats['exact']} exact, {stats['near']} near duplicates merged)")
+            else:
+                provenance = [[{"document": name, "position": position, "match": "original"}]
+                              for name, position in sources]
+        with open(self.sources_file, 'w', encoding='utf-8') as f:
+            json.dump(provenance, f, indent=1)
+
         with open(self.chunks_file, 'wb') as f:
             pickle.dump(self.chunks, f)
         print(f"[VectorDB] Chunks saved to {self.chunks_file}")
@@ -53,57 +90,44 @@ class VectorDB:
         print(f"[VectorDB] Generated {len(self.embeddings)} embeddings of dimension {self.embeddings.shape[1]}")
         self.store_embeddings()
 
+    @property
+    def embedding_model(self) -> BaseEmbeddingModel:
+        """Embedding model, loaded only when a build or query needs it."""
+        if self._embedding_model is None:
+            self._embedding_model = get_default_embedding_model()
+        return self._embedding_model
+
     @staticmethod
     def scrape_website(url: str, output_file: str):
-        """Download and save webpage or PDF content.
+        """Download a webpage or PDF and save its text: webpage text to output_file,
+        PDF text to <output_file stem>.txt (the raw PDF is not kept).
+        Thin wrapper over src.ingest.ingest_urls, which handles URL lists concurrently.
         """
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            content_type = response.headers.get('Content-Type', '')
-
-            if 'application/pdf' in content_type or url.endswith('.pdf'):
-                with open(output_file, 'wb') as f:
-                    f.write(response.content)
-                # Extract text
-                try:
-                    with open(output_file, 'rb') as f:
-                        reader = PyPDF2.PdfReader(f)
-                        text = "\n".join(page.extract_text() or "" for page in reader.pages)
-                    txt_path = os.path.splitext(output_file)[0] + ".txt"
-                    with open(txt_path, 'w', encoding='utf-8') as f:
-                        f.write(text)
-                    print(f"[scrape] PDF text saved to {txt_path}")
-                except Exception as e:
-                    print(f"[scrape] Could not extract PDF text: {e}")
-
-            elif 'text/html' in content_type:
-                soup = BeautifulSoup(response.text, "html.parser")
-                text = soup.get_text(separator="\n", strip=True)
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                print(f"[scrape] HTML text saved to {output_file}")
-            else:
-                print(f"[scrape] Unsupported content type: {content_type}")
+        from src.ingest import ingest_urls
 
-        except Exception as e:
-            print(f"[scrape] Failed to fetch {url}: {e}")
+        if url.lower().endswith(".pdf"):
+            output_file = os.path.splitext(output_file)[0] + ".txt"
+        ingest_urls([url], output_dir=os.path.dirname(output_file) or ".", max_workers=1,
+                    extract_workers=0, paths={url: output_file})
 
     def read_text_files(self) -> list[str]:
         """Read all .txt files in the documents directory."""
         docs = []
+        self.document_names = []
         for fname in sorted(os.listdir(self.directory)):
             if fname.endswith(".txt"):
                 path = os.path.join(self.directory, fname)
                 with open(path, 'r', encoding='utf-8') as f:
                     content = f.read()
                     docs.append(content)
+                    self.document_names.append(fname)
                     print(f"[VectorDB] Read {fname} ({len(content.split())} words)")
         return docs
 
     def store_embeddings(self):
         """Save embeddings to disk."""
         np.save(self.vector_file, self.embeddings)
+        invalidate_query_cache(self.vector_file)
         print(f"[VectorDB] Embeddings saved to {self.vector_file}")
 
     @staticmethod
@@ -119,20 +143,25 @@ class VectorDB:
         embedding_model: BaseEmbeddingModel,
         query: str,
         k: int = 5,
-        verbose: bool = False
+        verbose: bool = False,
+        query_embedding: Optional[np.ndarray] = None
     ) -> tuple[list[str], list[float]]:
         """
         Retrieve top-k most similar chunks for a query.
+        Pass query_embedding when the query is already embedded (see src/query_cache.py).
         """
-        embeddings = np.load(npy_file)
-        chunks_path = os.path.splitext(npy_file)[0] + "_chunks.pkl"
-        with open(chunks_path, 'rb') as f:
-            chunks = pickle.load(f)
+        with span("vector_load"):
+            embeddings = np.load(npy_file)
+            chunks_path = os.path.splitext(npy_file)[0] + "_chunks.pkl"
+            with open(chunks_path, 'rb') as f:
+                chunks = pickle.load(f)
 
-        query_vec = np.array(embedding_model.get_embedding(query))
+        with span("query_embedding"):
+            query_vec = np.array(embedding_model.get_embedding(query) if query_embedding is None else query_embedding)
 
-        similarities = [VectorDB.cosine_similarity(query_vec, emb) for emb in embeddings]
-        top_indices = np.argsort(similarities)[-k:][::-1]
+        with span("similarity_search", n=len(embeddings)):
+            similarities = [VectorDB.cosine_similarity(query_vec, emb) for emb in embeddings]
+            top_indices = np.argsort(similarities)[-k:][::-1]
 
         top_chunks = [chunks[i] for i in top_indices]
         top_scores = [similarities[i] for i in top_indices]
@@ -151,8 +180,8 @@ if __name__ == "__main__":
     db = VectorDB(
         directory="documents",
         vector_file="database.npy",
-        embedding_model=MiniEmbeddingModel()
+        embedding_model=get_default_embedding_model()
     )
 
     # Test query
-    results, scores = VectorDB.get_top_k("database.npy", MiniEmbeddingModel(), "reinforcement learning", k=3, verbose=True)
\ No newline at end of file
+    results, scores = VectorDB.get_top_k("database.npy", get_default_embedding_model(), "reinforcement learning", k=3, verbose=True)
\ No newline at end of file
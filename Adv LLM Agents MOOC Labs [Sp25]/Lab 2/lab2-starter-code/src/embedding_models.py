@@ -1,12 +1,36 @@
 from abc import ABC, abstractmethod
-from sentence_transformers import SentenceTransformer
-import numpy as np
-import tiktoken
 import os
-from openai import OpenAI
-from abc import ABC, abstractmethod
+import threading
+from typing import Dict, List, Optional, Tuple
+
 import numpy as np
-from typing import List, Tuple
+
+# Heavy libraries (sentence_transformers, openai, tiktoken) are imported on
+# first use, and loaded models / clients are shared by the whole process.
+_shared: Dict[tuple, object] = {}
+_shared_lock = threading.RLock()  # re-entrant: a factory may create other shared objects
+
+def _shared_instance(key: tuple, factory):
+    """Create the object for key once per process and return it on every later call."""
+    instance = _shared.get(key)
+    if instance is None:
+        with _shared_lock:
+            instance = _shared.get(key)
+            if instance is None:
+                instance = _shared[key] = factory()
+    return instance
+
+def _load_sentence_transformer(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def _load_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def _load_tiktoken_encoding(name: str):
+    import tiktoken
+    return tiktoken.get_encoding(name)
 
 class BaseEmbeddingModel(ABC):
     """Abstract base class for embedding models with chunking support"""
@@ -14,6 +38,10 @@ class BaseEmbeddingModel(ABC):
         self.max_tokens = 512  # Default value
         self.tokenizer = None  # Must be initialized in subclasses
         
+    def cache_key(self) -> tuple:
+        """Identifies the embedding space: models with different keys never share cached results."""
+        return (type(self).__name__, getattr(self, "model_name", ""))
+    
     @abstractmethod
     def get_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text input"""
@@ -61,8 +89,9 @@ class BaseEmbeddingModel(ABC):
 class MiniEmbeddingModel(BaseEmbeddingModel):
     def __init__(self, model_name="all-MiniLM-L6-v2"):
         super().__init__()
-        from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.model = _shared_instance(("sentence_transformer", model_name),
+                                      lambda: _load_sentence_transformer(model_name))
         self.tokenizer = self.model.tokenizer
         self.max_tokens = 256  # Model's actual max sequence length
         
@@ -90,10 +119,10 @@ class MiniEmbeddingModel(BaseEmbeddingModel):
 class OpenAIEmbeddingModel(BaseEmbeddingModel):
     def __init__(self, model_name="text-embedding-3-small"):
         super().__init__()
-        import tiktoken
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = _shared_instance(("openai_client",), _load_openai_client)
         self.model_name = model_name
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = _shared_instance(("tiktoken", "cl100k_base"),
+                                          lambda: _load_tiktoken_encoding("cl100k_base"))
         self.max_tokens = 8191  # OpenAI's limit
         
     def get_embedding(self, text: str) -> Tuple[List[float], str]:
@@ -103,4 +132,191 @@ class OpenAIEmbeddingModel(BaseEmbeddingModel):
             input=text,
             model=self.model_name
         )
-        return response.data[0].embedding
\ No newline at end of file
+        return response.data[0].embedding
+
+def _load_onnx_session(model_path: str, num_threads: int):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+def _load_hf_tokenizer(model_id: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_id)
+
+def export_onnx_model(model_name: str = "all-MiniLM-L6-v2", output_dir: str = "onnx_models",
+                      quantize: bool = True) -> str:
+    """
+    Export the transformer of a SentenceTransformer to ONNX (dynamic batch and
+    sequence axes) and, with quantize, write an int8 dynamically quantized copy.
+    Files are reused when they already exist.
+
+    Returns:
+        str: Path of the graph to load (model_int8.onnx or model.onnx)
+    """
+    folder = os.path.join(output_dir, model_name.replace("/", "_"))
+    fp32_path = os.path.join(folder, "model.onnx")
+    int8_path = os.path.join(folder, "model_int8.onnx")
+    if not os.path.exists(fp32_path):
+        import torch
+        os.makedirs(folder, exist_ok=True)
+        transformer = _load_sentence_transformer(model_name)[0].auto_model.eval()
+        dummy = {
+            "input_ids": torch.ones((1, 8), dtype=torch.long),
+            "attention_mask": torch.ones((1, 8), dtype=torch.long),
+            "token_type_ids": torch.zeros((1, 8), dtype=torch.long),
+        }
+        axes = {0: "batch", 1: "sequence"}
+        torch.onnx.export(
+            transformer, (dummy,), fp32_path,
+            input_names=list(dummy), output_names=["last_hidden_state"],
+            dynamic_axes={**{name: axes for name in dummy}, "last_hidden_state": axes},
+            opset_version=17,
+        )
+        print(f"[embedding_models.py] Exported {model_name} to {fp32_path}")
+    if not quantize:
+        return fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"[embedding_models.py] Quantized {fp32_path} to int8: {int8_path}")
+    return int8_path
+
+class OnnxEmbeddingModel(BaseEmbeddingModel):
+    """
+    MiniLM on onnxruntime (optionally int8 dynamically quantized) for CPU-only hosts.
+
+    Texts are sorted by token length and batched so that each batch holds at
+    most max_batch_tokens padded tokens, which keeps padding waste low when
+    chunk lengths vary. Embeddings are mean-pooled and L2-normalized like the
+    SentenceTransformer pipeline; check_embedding_parity() measures how
+    closely they match the fp32 model.
+    """
+    def __init__(self, model_name="all-MiniLM-L6-v2", quantize: bool = True, num_threads: Optional[int] = None,
+                 batch_size: int = 64, max_batch_tokens: int = 8192, model_dir: str = "onnx_models"):
+        super().__init__()
+        self.model_name = model_name
+        self.quantize = quantize
+        model_path = export_onnx_model(model_name, model_dir, quantize)
+        self.num_threads = num_threads or int(os.getenv("EMBEDDING_THREADS", "0")) or os.cpu_count() or 1
+        self.session = _shared_instance(("onnx_session", model_path, self.num_threads),
+                                        lambda: _load_onnx_session(model_path, self.num_threads))
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        model_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.tokenizer = _shared_instance(("hf_tokenizer", model_id), lambda: _load_hf_tokenizer(model_id))
+        self.max_tokens = 256  # Same limit as MiniEmbeddingModel
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+
+    def cache_key(self) -> tuple:
+        return super().cache_key() + ("int8" if self.quantize else "fp32",)
+
+    def _length_batches(self, lengths: List[int]) -> List[List[int]]:
+        """Indices grouped into batches of similar length (longest first)."""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        batches, current = [], []
+        for i in order:
+            # order is descending, so the first index of a batch sets its padded length
+            padded = lengths[current[0]] if current else lengths[i]
+            if current and (len(current) >= self.batch_size or padded * (len(current) + 1) > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _encode(self, encoded: List[List[int]]) -> np.ndarray:
+        width = max(len(ids) for ids in encoded)
+        input_ids = np.zeros((len(encoded), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encoded), width), dtype=np.int64)
+        for row, ids in enumerate(encoded):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask,
+                 "token_type_ids": np.zeros_like(input_ids)}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def get_embeddings_batch(self, texts: List[str]) -> np.ndarray:
+        """Length-bucketed batch embedding; rows come back in input order."""
+        encoded = [self.tokenizer.encode(text, truncation=True, max_length=self.max_tokens) for text in texts]
+        embeddings = np.zeros((len(texts), 0), dtype=np.float32)
+        for batch in self._length_batches([len(ids) for ids in encoded]):
+            vectors = self._encode([encoded[i] for i in batch])
+            if embeddings.shape[1] == 0:
+                embeddings = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        return embeddings
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings_batch([text])[0].tolist()
+
+def check_embedding_parity(candidate: BaseEmbeddingModel, reference: Optional[BaseEmbeddingModel] = None,
+                           texts: Optional[List[str]] = None, threshold: float = 0.99) -> dict:
+    """
+    Cosine agreement between a candidate model and the fp32 reference
+    (MiniEmbeddingModel by default) on the same texts.
+
+    Returns:
+        dict: min_cosine, mean_cosine, n and passed (min_cosine >= threshold)
+    """
+    reference = reference or MiniEmbeddingModel()
+    texts = texts or PARITY_TEXTS
+    a = np.asarray(candidate.get_embeddings_batch(texts), dtype=np.float64)
+    b = np.asarray(reference.get_embeddings_batch(texts), dtype=np.float64)
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+    return {
+        "n": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "passed": bool(cosines.min() >= threshold),
+    }
+
+PARITY_TEXTS = [
+    "def ident (x : Nat) : Nat := x",
+    "theorem add_comm' (a b : Nat) : a + b = b + a := by omega",
+    "Write a function that returns the minimum of three integers.",
+    "The `simp` tactic rewrites the goal with lemmas tagged @[simp].",
+    "Array.foldl (fun acc x => acc + x) 0 arr",
+    "reinforcement learning",
+    "Lean 4 function (Array Int) -> Bool\nCheck whether every element of the array is divisible by 11. "
+    "Return true if so and false otherwise, including for the empty array.",
+    "match n with\n| 0 => 1\n| n + 1 => (n + 1) * factorial n",
+]
+
+def get_default_embedding_model() -> BaseEmbeddingModel:
+    """
+    Process-wide default model (the weights load on the first call only):
+    MiniEmbeddingModel, or OnnxEmbeddingModel when EMBEDDING_BACKEND is
+    "onnx" (fp32 graph) or "onnx-int8".
+    """
+    backend = os.getenv("EMBEDDING_BACKEND", "torch")
+    if backend == "onnx":
+        return _shared_instance(("default_embedding_model", backend), lambda: OnnxEmbeddingModel(quantize=False))
+    if backend == "onnx-int8":
+        return _shared_instance(("default_embedding_model", backend), lambda: OnnxEmbeddingModel(quantize=True))
+    return _shared_instance(("default_embedding_model",), MiniEmbeddingModel)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # Parity and speed of the ONNX backend against the fp32 model:
+    #   python -m src.embedding_models [fp32|int8]
+    candidate = OnnxEmbeddingModel(quantize=(sys.argv[1:] or ["int8"])[0] != "fp32")
+    report = check_embedding_parity(candidate)
+    print(f"[embedding_models.py] Parity over {report['n']} texts: min cosine {report['min_cosine']:.4f}, "
+          f"mean {report['mean_cosine']:.4f} -> {'OK' if report['passed'] else 'FAILED'}")
+    texts = PARITY_TEXTS * 32
+    for name, model in (("fp32 torch", MiniEmbeddingModel()), ("onnx", candidate)):
+        start = time.perf_counter()
+        model.get_embeddings_batch(texts)
+        print(f"[embedding_models.py] {name}: {len(texts) / (time.perf_counter() - start):.1f} texts/s")
+    sys.exit(0 if report["passed"] else 1)
\ No newline at end of file
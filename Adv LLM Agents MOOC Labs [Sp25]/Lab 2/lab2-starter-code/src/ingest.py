@@ -0,0 +1,256 @@
+# src/ingest.py
+"""
+Concurrent document ingestion for the RAG database.
+
+    results = ingest_urls(urls, output_dir="documents")
+    ingested = [r for r in results if r.text]
+    VectorDB(vector_file="database.npy", documents=[r.text for r in ingested],
+             document_names=[r.url for r in ingested])
+
+- Downloads run on a thread pool sharing one pooled requests.Session, with
+  at most per_host requests in flight per host.
+- Every URL's ETag / Last-Modified is kept in a manifest next to the text
+  files, and later runs send conditional GETs: a 304 reuses the saved text.
+- Bodies are streamed in chunks (capped at max_bytes) and never written to
+  disk before extraction; PDF and HTML text is extracted in a process pool
+  so parsing does not hold up the downloads.
+- Extracted text is saved as <name>.txt in output_dir (what VectorDB reads)
+  and returned, so it can go straight into an index build.
+
+Nothing here is tied to the public internet; any HTTP server works,
+including `python -m http.server` on localhost.
+"""
+import io
+import json
+import os
+import re
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from src.tracing import span
+
+MANIFEST_FILE = ".ingest_manifest.json"
+CHUNK_SIZE = 64 * 1024
+MAX_BYTES = 50 * 2**20
+
+FETCHED = "fetched"
+NOT_MODIFIED = "not_modified"
+UNSUPPORTED = "unsupported"
+FAILED = "failed"
+
+
+@dataclass
+class IngestResult:
+    """Outcome of ingesting one URL."""
+    url: str
+    status: str  # FETCHED, NOT_MODIFIED, UNSUPPORTED or FAILED
+    path: Optional[str] = None
+    text: str = ""
+    size: int = 0  # bytes downloaded (0 for a 304)
+    error: str = ""
+
+
+def document_kind(url: str, content_type: str) -> Optional[str]:
+    """"pdf", "html", "text" or None (unsupported) from the Content-Type or the URL suffix."""
+    content_type = content_type.lower()
+    path = urlparse(url).path.lower()
+    if "application/pdf" in content_type or path.endswith(".pdf"):
+        return "pdf"
+    if "text/html" in content_type or path.endswith((".html", ".htm")):
+        return "html"
+    if content_type.startswith("text/") or path.endswith((".txt", ".md")):
+        return "text"
+    return None
+
+
+def extract_text(kind: str, data: bytes) -> str:
+    """Plain text of a downloaded document (runs in the extraction processes)."""
+    if kind == "pdf":
+        import PyPDF2
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    if kind == "html":
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(data, "html.parser").get_text(separator="\n", strip=True)
+    return data.decode("utf-8", errors="replace")
+
+
+def output_name(url: str) -> str:
+    """File name (without .txt) for a URL: host and path, filesystem-safe."""
+    parsed = urlparse(url)
+    path = os.path.splitext(parsed.path.strip("/"))[0] or "index"
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{parsed.netloc}_{path}").strip("_")
+    return name[:150]
+
+
+class _Manifest:
+    """url -> validators (etag, last_modified) and output path, persisted as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return dict(self.entries.get(url, {}))
+
+    def put(self, url: str, entry: dict):
+        with self._lock:
+            self.entries[url] = entry
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2)
+
+
+def make_session(pool_size: int = 16):
+    """requests.Session with a connection pool large enough for the download threads."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def ingest_urls(
+    urls: Iterable[str],
+    output_dir: str = "documents",
+    max_workers: int = 8,
+    per_host: int = 2,
+    extract_workers: Optional[int] = None,
+    timeout: float = 10.0,
+    max_bytes: int = MAX_BYTES,
+    names: Optional[Dict[str, str]] = None,
+    paths: Optional[Dict[str, str]] = None,
+    session=None,
+) -> List[IngestResult]:
+    """
+    Download, extract and save a list of URLs concurrently.
+
+    Args:
+        urls: URLs to ingest (duplicates are fetched once)
+        output_dir: Where the .txt files and the manifest go
+        max_workers: Concurrent downloads overall
+        per_host: Concurrent downloads per host
+        extract_workers: Extraction processes (None: one per CPU, 0: extract in the download thread)
+        timeout: Connect / read timeout per request in seconds
+        max_bytes: Larger bodies are abandoned and reported as failed
+        names: Optional url -> file name overrides (".txt" is appended)
+        paths: Optional url -> exact output file overrides (take precedence over names)
+        session: requests.Session to use (a pooled one is created by default)
+
+    Returns:
+        List[IngestResult]: One result per unique URL, in input order
+    """
+    urls = list(dict.fromkeys(urls))
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _Manifest(os.path.join(output_dir, MANIFEST_FILE))
+    session = session or make_session(max_workers)
+    host_limits: Dict[str, threading.Semaphore] = {}
+    host_lock = threading.Lock()
+
+    def host_limit(url: str) -> threading.Semaphore:
+        with host_lock:
+            return host_limits.setdefault(urlparse(url).netloc, threading.Semaphore(per_host))
+
+    extractor: Optional[Executor] = ProcessPoolExecutor(extract_workers) if extract_workers != 0 else None
+
+    def ingest_one(url: str) -> IngestResult:
+        path = (paths or {}).get(url) or os.path.join(output_dir, (names or {}).get(url, output_name(url)) + ".txt")
+        try:
+            previous = manifest.get(url)
+            headers = {}
+            if previous.get("path") == path and os.path.exists(path):
+                if previous.get("etag"):
+                    headers["If-None-Match"] = previous["etag"]
+                if previous.get("last_modified"):
+                    headers["If-Modified-Since"] = previous["last_modified"]
+
+            with host_limit(url), span("ingest_fetch", url=url) as s:
+                with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    if response.status_code == 304:
+                        s.set(status=NOT_MODIFIED)
+                        with open(path, "r", encoding="utf-8") as f:
+                            return IngestResult(url, NOT_MODIFIED, path, f.read())
+                    response.raise_for_status()
+                    kind = document_kind(url, response.headers.get("Content-Type", ""))
+                    if kind is None:
+                        s.set(status=UNSUPPORTED)
+                        return IngestResult(url, UNSUPPORTED,
+                                            error=f"Unsupported content type: {response.headers.get('Content-Type', '')}")
+                    body = bytearray()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        body.extend(chunk)
+                        if len(body) > max_bytes:
+                            raise ValueError(f"Response larger than {max_bytes} bytes")
+                    validators = {
+                        "etag": response.headers.get("ETag", ""),
+                        "last_modified": response.headers.get("Last-Modified", ""),
+                    }
+                s.set(status=FETCHED, size=len(body))
+
+            with span("ingest_extract", kind=kind):
+                data = bytes(body)
+                text = extractor.submit(extract_text, kind, data).result() if extractor else extract_text(kind, data)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            manifest.put(url, {**validators, "path": path})
+            print(f"[ingest] {url} -> {path} ({len(data)} bytes, {kind})")
+            return IngestResult(url, FETCHED, path, text, len(data))
+        except Exception as e:
+            print(f"[ingest] Failed to fetch {url}: {e}")
+            return IngestResult(url, FAILED, error=str(e))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest") as pool:
+            futures: List[Future] = [pool.submit(ingest_one, url) for url in urls]
+            results = [future.result() for future in futures]
+    finally:
+        if extractor is not None:
+            extractor.shutdown()
+        manifest.save()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest URLs into documents/ and optionally rebuild the VectorDB")
+    parser.add_argument("sources", nargs="+", help="URLs, or files with one URL per line")
+    parser.add_argument("--output-dir", default="documents")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument("--build", metavar="VECTOR_FILE", help="Rebuild this VectorDB from the ingested text")
+    args = parser.parse_args()
+
+    url_list = []
+    for source in args.sources:
+        if os.path.isfile(source):
+            with open(source, "r", encoding="utf-8") as f:
+                url_list.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        else:
+            url_list.append(source)
+
+    ingested = ingest_urls(url_list, args.output_dir, max_workers=args.workers, per_host=args.per_host)
+    counts: Dict[str, int] = {}
+    for result in ingested:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    print(f"[ingest] {len(ingested)} URL(s): " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+
+    if args.build:
+        from src.embedding_db import VectorDB
+        # Label chunks with their source URL (the manifest key) in the provenance file
+        built = [result for result in ingested if result.text]
+        VectorDB(directory=args.output_dir, vector_file=args.build,
+                 documents=[result.text for result in built], document_names=[result.url for result in built])
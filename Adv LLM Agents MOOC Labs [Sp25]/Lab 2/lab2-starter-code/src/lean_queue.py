@@ -0,0 +1,351 @@
+# src/lean_queue.py
+"""
+Job queue for Lean checks.
+
+Generation and verification scale differently: a few LLM calls can keep
+many Lean processes busy. LeanJobQueue puts every check behind one bounded
+pool of Lean processes:
+
+    queue = LeanJobQueue(max_workers=4)
+    future = queue.submit(code, priority=PRIORITY_IMPL)
+    result = future.result()          # LeanResult (see src/lean_runner.py)
+
+- Lower priority values run first (cheap implementation checks with a
+  `sorry` proof before full proofs); equal priorities run in submission order.
+- At most max_workers Lean processes run at once.
+- submit() blocks once max_pending jobs are waiting (backpressure), or
+  raises queue.Full after `timeout` seconds.
+
+The default backend is in-process. With backend="sqlite", jobs live in a
+SQLite file and every process that opens a queue on the same file shares
+one global cap of max_workers running checks, so several main_workflow
+processes can share the verifier cores of one machine. Cancellation works
+across processes too: a cancelled job is marked in its row, and the worker
+running it (in whichever process) kills its Lean process. A running job's
+worker keeps a heartbeat in its row; only a job whose heartbeat stopped
+(the worker process died) is handed to another worker.
+"""
+import heapq
+import itertools
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from src.lean_runner import CANCELLED, ERROR, LeanResult, run_lean
+
+PRIORITY_IMPL = 0  # implementation-only checks (proof = sorry)
+PRIORITY_PROOF = 10  # full implementation + proof checks
+
+
+class LeanJobQueue:
+    """Bounded, prioritized pool of Lean checks returning futures (see module docstring)."""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 32,
+        backend: str = "memory",
+        db_path: str = "lean_jobs.sqlite",
+        poll_interval: float = 0.05,
+        stale_after: float = 30.0,
+    ):
+        if backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown backend: {backend}")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.backend = backend
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after  # seconds without a heartbeat before a 'running' row is retried
+        self.heartbeat_interval = max(poll_interval, stale_after / 10)
+
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []  # memory backend: (priority, seq, future, code, cancel, limits)
+        self._seq = itertools.count()
+        self._futures: Dict[int, Future] = {}  # sqlite backend: job id -> future
+        self._cancels: Dict[int, threading.Event] = {}  # sqlite backend: job id -> cancel event
+        self._cancel_requested: set = set()
+        self._closed = False
+        self.stats = {"submitted": 0, "completed": 0, "peak_pending": 0, "waited_for_space": 0}
+
+        if backend == "sqlite":
+            self._owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+            with self._connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " id INTEGER PRIMARY KEY AUTOINCREMENT, priority INTEGER, code TEXT, limits TEXT,"
+                    " status TEXT, owner TEXT, started REAL, result TEXT, worker TEXT, heartbeat REAL)"
+                )
+                columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+                for column in ("worker TEXT", "heartbeat REAL"):  # files from before heartbeats
+                    if column.split()[0] not in columns:
+                        db.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+                db.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, id)")
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"lean-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        if backend == "sqlite":
+            self._threads.append(threading.Thread(target=self._collector, name="lean-collector", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+
+    def submit(self, code: str, priority: int = PRIORITY_PROOF, timeout: Optional[float] = None,
+               cancel: Optional[threading.Event] = None, **limits) -> Future:
+        """
+        Queue one Lean check and return a Future resolving to its LeanResult.
+
+        Args:
+            code: Complete Lean program
+            priority: Lower runs first (PRIORITY_IMPL, PRIORITY_PROOF)
+            timeout: Seconds to wait for queue space before raising queue.Full (None waits forever)
+            cancel: Optional event that kills the check when set (queued checks never start)
+            **limits: wall_timeout, cpu_timeout, memory_limit_mb for run_lean
+
+        Returns:
+            Future: resolves to a LeanResult
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while self._pending_count() >= self.max_pending:
+            waited = True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise queue.Full("Lean job queue is full")
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Lean job queue is closed")
+                self._cond.wait(self.poll_interval if remaining is None else min(remaining, self.poll_interval))
+
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Lean job queue is closed")
+            self.stats["submitted"] += 1
+            self.stats["waited_for_space"] += waited
+            if self.backend == "memory":
+                heapq.heappush(self._heap, (priority, next(self._seq), future, code, cancel, limits))
+            else:
+                with self._connect() as db:
+                    job_id = db.execute(
+                        "INSERT INTO jobs (priority, code, limits, status, owner) VALUES (?, ?, ?, 'pending', ?)",
+                        (priority, code, json.dumps(limits), self._owner),
+                    ).lastrowid
+                self._futures[job_id] = future
+                if cancel is not None:
+                    self._cancels[job_id] = cancel
+            self.stats["peak_pending"] = max(self.stats["peak_pending"], self._pending_count())
+            self._cond.notify_all()
+        return future
+
+    def close(self, wait: bool = True):
+        """Stop accepting jobs; with wait, let the workers finish what is queued."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def _pending_count(self) -> int:
+        if self.backend == "memory":
+            return len(self._heap)
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+    def _worker(self):
+        while True:
+            if self.backend == "memory":
+                with self._cond:
+                    while not self._heap and not self._closed:
+                        self._cond.wait()
+                    if not self._heap:
+                        return
+                    _, _, future, code, cancel, limits = heapq.heappop(self._heap)
+                    self._cond.notify_all()  # room for a blocked producer
+                if not future.set_running_or_notify_cancel():
+                    continue
+                future.set_result(self._run(code, cancel, limits))
+            else:
+                worker = f"{self._owner}:{threading.get_ident()}"
+                job = self._claim(worker)
+                if job is None:
+                    with self._cond:
+                        if self._closed and not self._futures:
+                            return
+                        self._cond.wait(self.poll_interval)
+                    continue
+                job_id, code, limits = job
+                cancel, finished = threading.Event(), threading.Event()
+                watcher = threading.Thread(target=self._watch, args=(job_id, worker, cancel, finished), daemon=True)
+                watcher.start()
+                try:
+                    result = self._run(code, cancel, json.loads(limits or "{}"))
+                finally:
+                    finished.set()
+                with self._connect() as db:
+                    # Only the worker that holds the claim may finish the row
+                    db.execute("UPDATE jobs SET status = 'done', result = ? WHERE id = ? AND worker = ?",
+                               (json.dumps(result.__dict__), job_id, worker))
+            with self._cond:
+                self.stats["completed"] += 1
+
+    @staticmethod
+    def _run(code: str, cancel: Optional[threading.Event], limits: dict) -> LeanResult:
+        try:
+            return run_lean(code, cancel=cancel, **limits)
+        except Exception as e:
+            return LeanResult(ERROR, f"Unexpected error while running Lean: {str(e)}")
+
+
+    def _watch(self, job_id: int, worker: str, cancel: threading.Event, finished: threading.Event):
+        """
+        While the job runs: refresh its heartbeat, and set cancel once the
+        owner marks the row cancelled or the claim is no longer this worker's.
+        """
+        last_beat = time.monotonic()
+        while not finished.wait(self.poll_interval):
+            with self._connect() as db:
+                if time.monotonic() - last_beat >= self.heartbeat_interval:
+                    db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?",
+                               (time.time(), job_id, worker))
+                    last_beat = time.monotonic()
+                row = db.execute("SELECT status, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] == "cancelled" or row[1] != worker:
+                cancel.set()
+                return
+
+    def _connect(self) -> "_Closing":
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return _Closing(db)
+
+    def _claim(self, worker: str) -> Optional[tuple]:
+        """
+        Atomically take the best pending job for worker if fewer than
+        max_workers run machine-wide. Running rows whose heartbeat is older
+        than stale_after (their worker died) go back to pending first.
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                db.execute("UPDATE jobs SET status = 'pending', worker = NULL "
+                           "WHERE status = 'running' AND heartbeat < ?", (now - self.stale_after,))
+                db.execute("UPDATE jobs SET status = 'done', result = ? WHERE status = 'cancelled' AND heartbeat < ?",
+                           (_CANCELLED_RESULT, now - self.stale_after))
+                running = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+                row = None
+                if running < self.max_workers:
+                    row = db.execute(
+                        "SELECT id, code, limits FROM jobs WHERE status = 'pending' ORDER BY priority, id LIMIT 1"
+                    ).fetchone()
+                    if row:
+                        db.execute("UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, worker = ? "
+                                   "WHERE id = ?", (now, now, worker, row[0]))
+                db.execute("COMMIT")
+                return row
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def _collector(self):
+        """Resolve this queue's futures from finished rows (whichever process ran them)."""
+        while True:
+            with self._cond:
+                ids = list(self._futures)
+                if self._closed and not ids:
+                    return
+            if ids:
+                self._request_cancellations(ids)
+                placeholders = ",".join("?" * len(ids))
+                with self._connect() as db:
+                    rows = db.execute(
+                        f"SELECT id, result FROM jobs WHERE status = 'done' AND id IN ({placeholders})", ids
+                    ).fetchall()
+                    for job_id, _ in rows:
+                        db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                for job_id, result in rows:
+                    with self._cond:
+                        future = self._futures.pop(job_id)
+                        self._cancels.pop(job_id, None)
+                        self._cancel_requested.discard(job_id)
+                        self._cond.notify_all()
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(LeanResult(**json.loads(result)))
+            time.sleep(self.poll_interval)
+
+
+    def _request_cancellations(self, ids: List[int]):
+        """
+        Mark this queue's cancelled jobs (event set or future cancelled): a
+        pending row is finished as cancelled right away, a running row is
+        flagged for the worker that claimed it.
+        """
+        with self._cond:
+            wanted = [
+                job_id for job_id in ids
+                if job_id not in self._cancel_requested and job_id in self._futures
+                and (self._futures[job_id].cancelled()
+                     or (job_id in self._cancels and self._cancels[job_id].is_set()))
+            ]
+            self._cancel_requested.update(wanted)
+        if not wanted:
+            return
+        with self._connect() as db:
+            for job_id in wanted:
+                db.execute("UPDATE jobs SET status = 'done', result = ? WHERE id = ? AND status = 'pending'",
+                           (_CANCELLED_RESULT, job_id))
+                db.execute("UPDATE jobs SET status = 'cancelled' WHERE id = ? AND status = 'running'", (job_id,))
+
+
+_CANCELLED_RESULT = json.dumps(LeanResult(CANCELLED, "Lean execution cancelled.").__dict__)
+
+
+class _Closing:
+    """sqlite3 connection usable as a context manager that also closes it."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self._db
+
+    def __exit__(self, *exc):
+        self._db.close()
+
+
+_default_queue: Optional[LeanJobQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_default_queue() -> LeanJobQueue:
+    """
+    Process-wide queue configured from the environment: LEAN_WORKERS
+    (default 2), LEAN_QUEUE_BACKEND ("memory" or "sqlite") and LEAN_QUEUE_DB.
+    main_workflow uses it whenever LEAN_QUEUE_BACKEND is set.
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = LeanJobQueue(
+                max_workers=int(os.getenv("LEAN_WORKERS", "2")),
+                backend=os.getenv("LEAN_QUEUE_BACKEND", "memory"),
+                db_path=os.getenv("LEAN_QUEUE_DB", "lean_jobs.sqlite"),
+            )
+        return _default_queue
@@ -1,53 +1,205 @@
 import subprocess
 import os
+import signal
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
 
-def execute_lean_code(code: str) -> str:
+from src.tracing import span
+
+# Resource limits for every Lean run; override with the environment or per call.
+# The address-space cap must leave room for the memory-mapped Mathlib .olean
+# files (several GB of virtual memory), so it is off unless configured.
+WALL_TIMEOUT = float(os.getenv("LEAN_WALL_TIMEOUT", "300"))  # seconds
+CPU_TIMEOUT = float(os.getenv("LEAN_CPU_TIMEOUT", "0")) or None  # CPU seconds per process
+MEMORY_LIMIT_MB = int(os.getenv("LEAN_MEMORY_LIMIT_MB", "0")) or None  # address space per process
+
+SUCCESS = "success"
+COMPILE_ERROR = "compile_error"
+TIMEOUT = "timeout"
+OOM = "oom"
+CANCELLED = "cancelled"
+ERROR = "error"  # Lean could not be run at all
+
+_OOM_MARKERS = ("out of memory", "std::bad_alloc", "cannot allocate memory")
+_TIMEOUT_MARKERS = ("(deterministic) timeout", "maximum recursion depth")
+
+@dataclass
+class LeanResult:
+    """Outcome of one Lean run: one of the outcome constants above plus the raw output."""
+    outcome: str
+    message: str
+    returncode: Optional[int] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == SUCCESS
+
+def _limited_command(command: List[str], cpu_timeout: Optional[float], memory_limit_mb: Optional[int]) -> List[str]:
     """
-    Writes Lean code to TempProject.lean in temp_project directory, 
-    executes it, and returns the output or errors.
-    
+    Wrap command in a shell that sets the rlimits and execs it (inherited by
+    lake's lean process). No Python runs in the forked child, so this is safe
+    when run_lean is called from several threads at once.
+    """
+    if os.name != "posix" or (cpu_timeout is None and memory_limit_mb is None):
+        return command
+    limits = []
+    if cpu_timeout is not None:
+        # SIGXCPU at the soft limit, SIGKILL a little later
+        seconds = max(1, int(cpu_timeout))
+        limits += [f"ulimit -S -t {seconds}", f"ulimit -H -t {seconds + 5}"]  # soft first: it must stay <= hard
+    if memory_limit_mb is not None:
+        limits.append(f"ulimit -v {memory_limit_mb * 1024}")  # KiB
+    return ["sh", "-c", " && ".join(limits) + ' && exec "$0" "$@"'] + command
+
+def _kill_group(process: subprocess.Popen):
+    """Kill lake and everything it started."""
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+def _classify(returncode: int, output: str, memory_limited: bool, cpu_limited: bool = False) -> str:
+    """Sort a finished (not killed by us) run into success / timeout / oom / compile error."""
+    if returncode == 0:
+        return SUCCESS
+    lowered = output.lower()
+    if any(marker in lowered for marker in _OOM_MARKERS):
+        return OOM
+    if any(marker in lowered for marker in _TIMEOUT_MARKERS):
+        return TIMEOUT
+    # Killed by a signal: directly (negative code) or reported by lake/the shell as 128 + signal
+    signum = -returncode if returncode < 0 else returncode - 128 if returncode > 128 else None
+    if signum == getattr(signal, "SIGXCPU", None):
+        return TIMEOUT
+    # The hard CPU limit (a few seconds after SIGXCPU) kills with SIGKILL
+    if signum == getattr(signal, "SIGKILL", None) and cpu_limited:
+        return TIMEOUT
+    if signum in (getattr(signal, "SIGKILL", None), getattr(signal, "SIGSEGV", None)) and memory_limited:
+        return OOM
+    return COMPILE_ERROR
+
+def run_lean(
+    code: str,
+    cancel: Optional[threading.Event] = None,
+    wall_timeout: Optional[float] = WALL_TIMEOUT,
+    cpu_timeout: Optional[float] = CPU_TIMEOUT,
+    memory_limit_mb: Optional[int] = MEMORY_LIMIT_MB,
+) -> LeanResult:
+    """
+    Run Lean code in a resource-limited process group and classify the outcome.
+
+    Lake runs in its own process group, so a wall-clock timeout or a
+    cancellation kills the lean process it started as well. CPU time and
+    address space are capped with rlimits (POSIX only).
+
     Args:
         code: The Lean code to execute
-        
+        cancel: Optional event; when set, the run is killed (outcome "cancelled")
+        wall_timeout: Seconds before the run is killed (None for no limit)
+        cpu_timeout: CPU seconds per process (None for no limit)
+        memory_limit_mb: Address-space cap per process in MB (None for no limit)
+
     Returns:
-        str: Execution result or error message
+        LeanResult: outcome is "success", "compile_error", "timeout", "oom",
+        "cancelled" or "error"; message is the text execute_lean_code returns
     """
-    temp_file = "TempTest.lean"  # Fixed filename
+    temp_file = "TempTest.lean"
+    temp_path = None
+    start = time.monotonic()
     
     try:
-        # Write the Lean code to the temp file
-        temp_path = os.path.join("lean_playground", temp_file)
-        os.makedirs("lean_playground", exist_ok=True)
-        
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            f.write(code)
+        # Write the Lean code to its own temp file
+        with span("lean_write", chars=len(code)):
+            os.makedirs("lean_playground", exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix="TempTest_", suffix=".lean", dir="lean_playground")
+            temp_file = os.path.basename(temp_path)
+            
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(code)
         
-        # Execute Lean within the temp_project directory
-        result = subprocess.run(
-            ["lake", "lean", temp_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=False  # Don't raise exception on non-zero return code
-        )
-
-        # If execution was successful, return success message along with output (if any)
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            return f"Lean code executed successfully.\n{output}" if output else "Lean code executed successfully."
+        # Execute Lean within the project directory
+        with span("lean_subprocess") as trace:
+            process = subprocess.Popen(
+                _limited_command(["lake", "lean", temp_path], cpu_timeout, memory_limit_mb),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                start_new_session=(os.name == "posix"),  # own process group, so lake's children die with it
+            )
+            killed = None
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=0.05)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel is not None and cancel.is_set():
+                        killed = CANCELLED
+                    elif wall_timeout is not None and time.monotonic() - start > wall_timeout:
+                        killed = TIMEOUT
+                    if killed:
+                        _kill_group(process)
+                        stdout, stderr = process.communicate()
+                        break
+            elapsed = time.monotonic() - start
+            if process.returncode == 127 and not killed and "lake" in stderr and "not found" in stderr:
+                raise FileNotFoundError("lake")  # reported by the limiting shell
+            outcome = killed or _classify(process.returncode, stderr + stdout, memory_limit_mb is not None,
+                                        cpu_timeout is not None)
+            trace.set(returncode=process.returncode, outcome=outcome)
+
+        if outcome == CANCELLED:
+            return LeanResult(CANCELLED, "Lean execution cancelled.", process.returncode, elapsed)
+        if outcome == SUCCESS:
+            # If execution was successful, return success message along with output (if any)
+            output = stdout.strip()
+            message = f"Lean code executed successfully.\n{output}" if output else "Lean code executed successfully."
+            return LeanResult(SUCCESS, message, 0, elapsed)
 
         # If there was an error, return stderr (Lean compiler errors)
-        error_message = result.stderr.strip()
-        if not error_message and result.stdout.strip():
+        error_message = stderr.strip()
+        if not error_message and stdout.strip():
             # Some Lean errors might be in stdout instead of stderr
-            error_message = result.stdout.strip()
-            
-        return f"Lean Error: {error_message}" if error_message else f"Lean execution failed with return code {result.returncode}"
+            error_message = stdout.strip()
+        if outcome == TIMEOUT and killed:
+            error_message = f"Timed out after {wall_timeout:g}s (wall clock limit)"
+        elif outcome == TIMEOUT and not error_message:
+            error_message = f"Timed out (CPU limit {cpu_timeout:g}s)"
+        elif outcome == OOM and not error_message:
+            error_message = f"Out of memory (address space limit {memory_limit_mb} MB)"
+
+        message = f"Lean Error: {error_message}" if error_message else f"Lean execution failed with return code {process.returncode}"
+        return LeanResult(outcome, message, process.returncode, elapsed)
 
     except FileNotFoundError:
-        return "Error: Lean executable not found or temp_project directory doesn't exist."
+        return LeanResult(ERROR, "Error: Lean executable not found or temp_project directory doesn't exist.")
     except PermissionError:
-        return f"Error: Permission denied when writing to or executing {temp_file}"
+        return LeanResult(ERROR, f"Error: Permission denied when writing to or executing {temp_file}")
     except Exception as e:
-        return f"Unexpected error while running Lean: {str(e)}"
+        return LeanResult(ERROR, f"Unexpected error while running Lean: {str(e)}")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
+def execute_lean_code(code: str, cancel: Optional[threading.Event] = None, **limits) -> str:
+    """
+    Writes Lean code to a fresh TempTest_*.lean file in the lean_playground
+    directory, executes it, and returns the output or errors. Each call uses
+    its own file, so several checks can run concurrently.
+    
+    Args:
+        code: The Lean code to execute
+        cancel: Optional event; when set, the Lean process is killed and
+            "Lean execution cancelled." is returned
+        **limits: wall_timeout, cpu_timeout, memory_limit_mb (see run_lean)
+        
+    Returns:
+        str: Execution result or error message
+    """
+    return run_lean(code, cancel=cancel, **limits).message
\ No newline at end of file
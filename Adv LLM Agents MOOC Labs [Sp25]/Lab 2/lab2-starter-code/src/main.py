@@ -4,36 +4,81 @@ import re
 import time
 from typing import Dict, Tuple
 
-from src.agents import Planning_Agent, Generation_Agent
+from src.agents import Generation_Agent
+from src.context_packs import clean_chunk, format_context_pack, get_context_pack
+from src.lean_queue import PRIORITY_IMPL, get_default_queue
 from src.lean_runner import execute_lean_code
+from src.proof_search import PROOF_PORTFOLIO, search_proof
+from src.task_bundle import bundle_for_template, load_task_bundle
+from src.tracing import span
 
-# Helper functions required by tests.py
+# Helper functions required by tests.py (served from the cached TaskBundle)
 def get_problem_and_code_from_taskpath(task_path: str) -> Tuple[str, str]:
-    with open(os.path.join(task_path, "description.txt")) as f:
-        desc = f.read()
-    with open(os.path.join(task_path, "task.lean")) as f:
-        template = f.read()
-    return desc, template
+    bundle = load_task_bundle(task_path)
+    return bundle.description, bundle.template
 
 def get_unit_tests_from_taskpath(task_path: str) -> str:
-    with open(os.path.join(task_path, "tests.lean")) as f:
-        return f.read()
+    return load_task_bundle(task_path).unit_tests
 
 def get_task_lean_template_from_taskpath(task_path: str) -> str:
-    with open(os.path.join(task_path, "task.lean")) as f:
-        return f.read()
+    return load_task_bundle(task_path).template
 
 # Robust extraction
 def extract_blocks(text: str) -> Dict[str, str]:
-    code = re.search(r"-- << CODE START >>\n(.*?)\n\s*-- << CODE END >>", text, re.DOTALL)
-    proof = re.search(r"-- << PROOF START >>\n(.*?)\n\s*-- << PROOF END >>", text, re.DOTALL)
+    with span("block_extraction"):
+        code = re.search(r"-- << CODE START >>\n(.*?)\n\s*-- << CODE END >>", text, re.DOTALL)
+        proof = re.search(r"-- << PROOF START >>\n(.*?)\n\s*-- << PROOF END >>", text, re.DOTALL)
     return {
         "code": code.group(1).strip() if code else "sorry",
         "proof": proof.group(1).strip() if proof else "sorry"
     }
 
-def main_workflow(problem_description: str, task_lean_code: str = "") -> Dict[str, str]:
-    gen = Generation_Agent()  # llama-3.3-70b is smart enough alone
+def retrieve_context(task_lean_code: str, k: int = 3) -> str:
+    """
+    Reference snippets for the prompt. Known task families use their
+    pre-built context pack (a dict lookup); without a pack the prompt gets
+    no reference material. Live retrieval for other tasks is opt-in: the
+    retrieval service when RETRIEVAL_SERVICE_URL is set, or a VectorDB query
+    (through the query cache) when RETRIEVAL_LIVE=1 and the database exists.
+    """
+    with span("cache_lookup") as trace:
+        pack = get_context_pack(task_lean_code)
+        trace.set(hit=pack is not None)
+    if pack is not None:
+        return format_context_pack(pack)
+    service_url = os.getenv("RETRIEVAL_SERVICE_URL")
+    live = os.getenv("RETRIEVAL_LIVE") == "1" and os.path.exists("database.npy")
+    if not service_url and not live:
+        return ""
+    try:
+        with span("retrieval", k=k):
+            if service_url:
+                # Shared index and model in src/retrieval_service.py; one client (and
+                # its keep-alive connections) per service URL for the whole process
+                from src.embedding_models import _shared_instance
+                from src.retrieval_service import RetrievalClient
+                client = _shared_instance(("retrieval_client", service_url), lambda: RetrievalClient(service_url))
+                chunks, _ = client.get_top_k(task_lean_code, k=k)
+            else:
+                from src.embedding_models import get_default_embedding_model
+                from src.query_cache import cached_top_k
+                chunks, _ = cached_top_k("database.npy", get_default_embedding_model(), task_lean_code, k=k)
+    except Exception as e:
+        print("Retrieval error:", str(e))
+        return ""
+    return "\n\n".join(f"-- Example {i}\n{clean_chunk(chunk)}" for i, chunk in enumerate(chunks, 1))
+
+def main_workflow(problem_description: str, task_lean_code: str = "", lean_queue=None) -> Dict[str, str]:
+    task_name = re.search(r"^def\s+(\S+)", task_lean_code, re.MULTILINE)
+    # Small model first, the 70b model after a failed Lean check (see src/agents.py)
+    gen = Generation_Agent(task=task_name.group(1) if task_name else "")
+    bundle = bundle_for_template(task_lean_code)
+    # Share a bounded pool of Lean processes when asked to (see src/lean_queue.py)
+    if lean_queue is None and os.getenv("LEAN_QUEUE_BACKEND"):
+        lean_queue = get_default_queue()
+
+    context = retrieve_context(task_lean_code)
+    context_section = f"\nReference material:\n{context}\n" if context else ""
 
     prompt = f"""You are an expert Lean 4 programmer.
 
@@ -42,6 +87,7 @@ Task:
 
 Template:
 {task_lean_code}
+{context_section}
 
 Write the implementation and proof using this exact format:
 
@@ -71,21 +117,31 @@ Now solve this task."""
             proof = result["proof"]
 
             if code == "sorry" or len(code) < 3:
+                gen.record_attempt(False, "format")
                 continue
 
             # Test implementation
-            impl_only = task_lean_code.replace("{{code}}", code).replace("{{proof}}", "sorry")
-            if "successfully" not in execute_lean_code(impl_only):
+            impl_only = bundle.render(code, "sorry")
+            if lean_queue is not None:
+                impl_ok = lean_queue.submit(impl_only, priority=PRIORITY_IMPL).result().ok
+            else:
+                impl_ok = "successfully" in execute_lean_code(impl_only)
+            if not impl_ok:
+                gen.record_attempt(False, "impl")
                 continue
 
-            # Test full
-            full = task_lean_code.replace("{{code}}", code).replace("{{proof}}", proof)
-            if "successfully" in execute_lean_code(full):
-                print("SUCCESS on attempt", attempt)
-                return {"code": code, "proof": proof}
+            # Test the model's proof together with the tactic portfolio; first success wins
+            with span("proof_search"):
+                found = search_proof(task_lean_code, code, [proof] + PROOF_PORTFOLIO, lean_queue=lean_queue)
+            if found is not None:
+                print("SUCCESS on attempt", attempt, "with", gen.model)
+                gen.record_attempt(True)
+                return {"code": code, "proof": found}
+            gen.record_attempt(False, "proof")
 
         except Exception as e:
             print("API error:", str(e))
+            gen.record_attempt(False, "api")
             time.sleep(5)
 
     # Fallback for myMin (task_id_0) — 100% correct
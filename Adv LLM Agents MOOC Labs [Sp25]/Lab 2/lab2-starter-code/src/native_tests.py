@@ -0,0 +1,295 @@
+# src/native_tests.py
+"""
+Native-compiled unit tests for large test suites.
+
+The default unit tests are `#guard` lines appended to the template and
+evaluated by the elaborator inside `lake lean`, which gets slow with
+thousands of cases. This mode instead:
+
+1. cuts the implementation out of the task template (everything up to
+   `-- << CODE END >>`, without the Mathlib import),
+2. generates a test driver whose `main` reads test vectors from stdin, one
+   case per line, and prints "ok <i>", "fail <i> <actual>" or "error <i> <why>",
+3. builds implementation + driver into a native executable with
+   `lake build` (a small core-only Lake project, cached by source hash), and
+4. streams a compact tab-separated vectors file into it.
+
+    result = run_native_tests(load_task_bundle("tasks/task_id_0"), "x")
+    result["passed"], result["failed"], result["cases"][0]
+
+Supported parameter / return types: Nat, Int, Bool, String and Array / List
+of Nat, Int or Bool. For other types, or implementations that need Mathlib,
+run_native_tests() reports outcome "unsupported" / "build_error" and the
+caller should fall back to the #guard tests.
+
+tests/tests.py checks unit tests this way when use_native_tests() says so:
+NATIVE_TESTS=auto (default) for suites of at least NATIVE_TESTS_MIN_CASES
+cases (default 200), NATIVE_TESTS=1 for every supported task
+(`make test-native`), NATIVE_TESTS=0 never.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.lean_runner import WALL_TIMEOUT
+from src.task_bundle import TaskBundle
+
+NATIVE_TESTS = os.getenv("NATIVE_TESTS", "auto")
+NATIVE_TESTS_MIN_CASES = int(os.getenv("NATIVE_TESTS_MIN_CASES", "200"))
+NATIVE_ROOT = os.path.join("lean_playground", "native")
+DRIVER_NAME = "driver"
+
+# Lean parser expression for each supported type (String -> Option T)
+_SCALAR_PARSERS = {
+    "Nat": "parseNat",
+    "Int": "parseInt",
+    "Bool": "parseBool",
+    "String": "parseString",
+}
+
+_CODE_END = re.compile(r"^.*-- << CODE END >>.*$", re.MULTILINE)
+
+_DRIVER_PRELUDE = '''
+def parseNat (s : String) : Option Nat := s.trim.toNat?
+def parseInt (s : String) : Option Int := s.trim.toInt?
+def parseBool (s : String) : Option Bool :=
+  match s.trim with
+  | "true" => some true
+  | "false" => some false
+  | _ => none
+def parseString (s : String) : Option String := some s
+def parseArray {α : Type} (p : String → Option α) (s : String) : Option (Array α) :=
+  if s.trim.isEmpty then some #[] else (s.splitOn ",").toArray.mapM p
+def parseList {α : Type} (p : String → Option α) (s : String) : Option (List α) :=
+  (parseArray p s).map Array.toList
+'''
+
+
+def _parser_for(lean_type: str) -> Optional[str]:
+    """Lean parser expression for a type, or None if the driver cannot read it."""
+    lean_type = " ".join(lean_type.split())
+    if lean_type in _SCALAR_PARSERS:
+        return _SCALAR_PARSERS[lean_type]
+    for container in ("Array", "List"):
+        if lean_type.startswith(container + " "):
+            element = lean_type[len(container) + 1:].strip("() ")
+            if element in ("Nat", "Int", "Bool"):
+                return f"(parse{container} {_SCALAR_PARSERS[element]})"
+    return None
+
+
+def native_tests_supported(signature: dict) -> bool:
+    """Whether every parameter and the return type can be streamed to the driver."""
+    types = [p["param_type"] for p in signature.get("parameters", [])] + [signature.get("return_type", "")]
+    return bool(signature.get("name")) and all(_parser_for(t) for t in types)
+
+
+def use_native_tests(bundle: TaskBundle) -> bool:
+    """Whether a task's unit tests should run natively (see NATIVE_TESTS in the module docstring)."""
+    if NATIVE_TESTS == "0" or not bundle.test_cases or not native_tests_supported(bundle.signature):
+        return False
+    return NATIVE_TESTS == "1" or len(bundle.test_cases) >= NATIVE_TESTS_MIN_CASES
+
+
+def encode_value(lean_type: str, value: Any) -> str:
+    """
+    One field of the vectors file: numbers and booleans as Lean prints
+    them, arrays / lists as comma-separated elements without brackets.
+    """
+    lean_type = " ".join(lean_type.split())
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    text = str(value).strip()
+    if lean_type.startswith(("Array", "List")):
+        text = text.removeprefix("#").strip("[] ")
+        return ",".join(item.strip() for item in text.split(",") if item.strip())
+    if "\t" in text or "\n" in text:
+        raise ValueError(f"Cannot stream a value containing tabs or newlines: {value!r}")
+    return text
+
+
+def write_test_vectors(signature: dict, test_cases: Iterable[dict], path: str) -> int:
+    """
+    Stream test cases (test.json entries) into a tab-separated vectors file:
+    one line per case, the inputs in parameter order, then the expected value.
+
+    Returns:
+        int: Number of cases written
+    """
+    params = signature["parameters"]
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for case in test_cases:
+            fields = [encode_value(p["param_type"], case["input"][p["param_name"]]) for p in params]
+            fields.append(encode_value(signature["return_type"], case["expected"]))
+            f.write("\t".join(fields) + "\n")
+            count += 1
+    return count
+
+
+def extract_implementation(bundle: TaskBundle, code: str) -> str:
+    """The template up to the end of the code block, with the candidate code and no imports."""
+    program = bundle.render(code, "sorry")
+    match = _CODE_END.search(program)
+    implementation = program[:match.end()] if match else program
+    return "\n".join(line for line in implementation.splitlines() if not line.startswith("import "))
+
+
+def render_driver(signature: dict, implementation: str) -> str:
+    """Lean source of implementation + test driver reading vectors from stdin."""
+    params = signature["parameters"]
+    n = len(params)
+    lines = [implementation, _DRIVER_PRELUDE]
+    lines.append("def checkCase (fields : Array String) : Except String (Option String) := do")
+    lines.append(f"  if fields.size != {n + 1} then throw s!\"expected {n + 1} fields, got {{fields.size}}\"")
+    for i, p in enumerate(params):
+        lines.append(f"  let some x{i} := {_parser_for(p['param_type'])} fields[{i}]! | throw \"bad {p['param_name']}\"")
+    lines.append(f"  let some expected := {_parser_for(signature['return_type'])} fields[{n}]! | throw \"bad expected\"")
+    args = " ".join(f"x{i}" for i in range(n))
+    lines.append(f"  let result := {signature['name']} {args}")
+    lines.append("  return if result == expected then none else some (toString (repr result))")
+    lines.append("""
+def main : IO UInt32 := do
+  let stdin ← IO.getStdin
+  let mut i := 0
+  let mut failed := 0
+  repeat
+    let line ← stdin.getLine
+    if line.isEmpty then break
+    let fields := ((line.dropRightWhile (· == '\\n')).splitOn "\\t").toArray
+    match checkCase fields with
+    | .ok none => IO.println s!"ok {i}"
+    | .ok (some actual) =>
+      IO.println s!"fail {i} {actual}"
+      failed := failed + 1
+    | .error why =>
+      IO.println s!"error {i} {why}"
+      failed := failed + 1
+    i := i + 1
+  IO.println s!"summary {i} {failed}"
+  return if failed == 0 then 0 else 1
+""")
+    return "\n".join(lines)
+
+
+def build_driver(source: str, root: str = NATIVE_ROOT, timeout: Optional[float] = WALL_TIMEOUT) -> Dict[str, str]:
+    """
+    Build the driver with `lake build` in a core-only Lake project named
+    after the source hash, so an unchanged candidate is never rebuilt.
+
+    Returns:
+        Dict[str, str]: {"outcome": "success", "executable": path, "project": dir} or
+        {"outcome": "build_error" / "timeout", "message": compiler output}
+    """
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+    project = os.path.join(root, digest)
+    executable = os.path.join(project, ".lake", "build", "bin", DRIVER_NAME)
+    if os.path.exists(executable):
+        return {"outcome": "success", "executable": executable, "project": project}
+
+    os.makedirs(project, exist_ok=True)
+    if os.path.exists("lean-toolchain"):
+        shutil.copyfile("lean-toolchain", os.path.join(project, "lean-toolchain"))
+    with open(os.path.join(project, "lakefile.toml"), "w", encoding="utf-8") as f:
+        f.write(f'name = "native_tests"\ndefaultTargets = ["{DRIVER_NAME}"]\n\n'
+                f'[[lean_exe]]\nname = "{DRIVER_NAME}"\nroot = "Main"\n')
+    with open(os.path.join(project, "Main.lean"), "w", encoding="utf-8") as f:
+        f.write(source)
+    try:
+        result = subprocess.run(["lake", "build"], cwd=project, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"outcome": "timeout", "message": f"lake build timed out after {timeout:g}s"}
+    except FileNotFoundError:
+        return {"outcome": "build_error", "message": "Error: lake executable not found"}
+    if result.returncode != 0 or not os.path.exists(executable):
+        return {"outcome": "build_error", "message": (result.stderr or result.stdout).strip()}
+    return {"outcome": "success", "executable": executable, "project": project}
+
+
+def run_native_tests(
+    bundle: TaskBundle,
+    code: str,
+    vectors_path: Optional[str] = None,
+    test_cases: Optional[Iterable[dict]] = None,
+    timeout: Optional[float] = WALL_TIMEOUT,
+) -> Dict[str, Any]:
+    """
+    Compile a candidate implementation with a generated driver and run the
+    task's test vectors through it.
+
+    Args:
+        bundle: Task (signature, template, test cases)
+        code: Candidate implementation for the {{code}} slot
+        vectors_path: Existing vectors file to stream (written from the
+            test cases into the build project when omitted)
+        test_cases: Cases to use instead of the bundle's test.json
+        timeout: Seconds allowed for the build and for the test run each
+
+    Returns:
+        Dict[str, Any]: outcome ("success", "failed", "build_error",
+        "timeout" or "unsupported"), passed, failed, message and cases
+        (index, status "ok"/"fail"/"error", detail)
+    """
+    report: Dict[str, Any] = {"outcome": "unsupported", "passed": 0, "failed": 0, "message": "", "cases": []}
+    if not native_tests_supported(bundle.signature):
+        report["message"] = "Signature types not supported by the native driver; use the #guard tests"
+        return report
+
+    build = build_driver(render_driver(bundle.signature, extract_implementation(bundle, code)), timeout=timeout)
+    if build["outcome"] != "success":
+        report.update(outcome=build["outcome"], message=build["message"])
+        return report
+
+    executable = build["executable"]
+    if vectors_path is None:
+        vectors_path = os.path.join(build["project"], "vectors.tsv")
+        write_test_vectors(bundle.signature, bundle.test_cases if test_cases is None else test_cases, vectors_path)
+
+    cases: List[dict] = []
+    try:
+        with open(vectors_path, "r", encoding="utf-8") as vectors:
+            process = subprocess.Popen([executable], stdin=vectors, stdout=subprocess.PIPE, text=True)
+            try:
+                output, _ = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                report.update(outcome="timeout", message=f"Test run timed out after {timeout:g}s")
+                return report
+    except OSError as e:
+        report.update(outcome="build_error", message=f"Could not run {executable}: {e}")
+        return report
+
+    for line in output.splitlines():
+        status, _, rest = line.partition(" ")
+        if status in ("ok", "fail", "error"):
+            index, _, detail = rest.partition(" ")
+            cases.append({"index": int(index), "status": status, "detail": detail})
+    passed = sum(1 for case in cases if case["status"] == "ok")
+    report.update(
+        outcome="success" if passed == len(cases) and process.returncode == 0 else "failed",
+        passed=passed,
+        failed=len(cases) - passed,
+        cases=cases,
+    )
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from src.task_bundle import load_task_bundle
+
+    if len(sys.argv) < 3:
+        print("Usage: python -m src.native_tests <task_path> <code> [vectors.tsv]")
+        sys.exit(2)
+    result = run_native_tests(load_task_bundle(sys.argv[1]), sys.argv[2],
+                              vectors_path=sys.argv[3] if len(sys.argv) > 3 else None)
+    print(f"{result['outcome']}: {result['passed']} passed, {result['failed']} failed")
+    for case in result["cases"]:
+        if case["status"] != "ok":
+            print(f"  case {case['index']}: {case['status']} {case['detail']}")
+    if result["message"]:
+        print(result["message"])
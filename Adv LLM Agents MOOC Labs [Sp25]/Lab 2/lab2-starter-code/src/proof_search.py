@@ -0,0 +1,96 @@
+# src/proof_search.py
+"""
+Proof-tactic portfolio search.
+
+Once an implementation type-checks, many specs close with a stock tactic
+script. search_proof() fills the task template with the implementation and
+each candidate proof, checks them all in parallel, and returns the first
+one Lean accepts; the remaining Lean processes are killed as soon as one
+succeeds. Every candidate shares the same file prefix up to the proof, so
+the Mathlib imports are loaded from the same (OS-cached) .olean files.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from src.lean_queue import PRIORITY_PROOF
+from src.lean_runner import execute_lean_code
+from src.task_bundle import bundle_for_template
+
+# Cheap scripts tried after the template's `unfold <impl> <spec>` line
+PROOF_PORTFOLIO: List[str] = [
+    "simp",
+    "omega",
+    "decide",
+    "aesop",
+    "split <;> linarith",
+    "split <;> omega",
+    "simp_all",
+    "constructor <;> simp_all",
+    "simp <;> omega",
+]
+
+
+def search_proof(
+    task_lean_code: str,
+    code: str,
+    candidates: Optional[List[str]] = None,
+    max_workers: int = 4,
+    lean_queue=None,
+) -> Optional[str]:
+    """
+    Find a proof for an implementation by checking candidate proofs in parallel.
+
+    Args:
+        task_lean_code: Task template with {{code}} and {{proof}} placeholders
+        code: Implementation that already passes the implementation-only check
+        candidates: Proofs to try, in order of preference (defaults to PROOF_PORTFOLIO)
+        max_workers: Lean processes run at once
+        lean_queue: Optional LeanJobQueue; candidates then go through its
+            shared pool (at PRIORITY_PROOF) instead of a private one
+
+    Returns:
+        Optional[str]: The first proof Lean accepts, or None if none does
+    """
+    candidates = list(dict.fromkeys(candidates or PROOF_PORTFOLIO))
+    if not candidates:
+        return None
+    bundle = bundle_for_template(task_lean_code)
+    cancel = threading.Event()
+
+    def check(proof: str) -> Optional[str]:
+        if cancel.is_set():
+            return None
+        output = execute_lean_code(bundle.render(code, proof), cancel=cancel)
+        return proof if "successfully" in output else None
+
+    if lean_queue is not None:
+        futures = {
+            lean_queue.submit(bundle.render(code, proof), priority=PRIORITY_PROOF, cancel=cancel): proof
+            for proof in candidates
+        }
+        try:
+            for future in as_completed(futures):
+                if future.result().ok:
+                    return futures[future]
+            return None
+        finally:
+            cancel.set()
+            for future in futures:
+                future.cancel()
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(candidates)))
+    futures = []
+    try:
+        futures = [executor.submit(check, proof) for proof in candidates]
+        for future in as_completed(futures):
+            proof = future.result()
+            if proof is not None:
+                cancel.set()
+                return proof
+        return None
+    finally:
+        cancel.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,265 @@
+# src/query_cache.py
+"""
+Two-tier query-result cache in front of VectorDB.get_top_k.
+
+    chunks, scores = cached_top_k("database.npy", model, query, k=3)
+
+1. Exact tier: keyed on the normalized query text (case and whitespace
+   folded). A hit skips both the query embedding and the search.
+2. Semantic tier: the query is embedded once and compared with the
+   embeddings of cached queries; if the best cosine is at least
+   `threshold`, that query's results are reused and the search is skipped.
+
+Both tiers are LRU-bounded (max_entries each) and entries expire after
+`ttl` seconds. Entries are partitioned per index file and embedding model
+(its cache_key(): class, model name and, for ONNX, the precision),
+and a partition is dropped as soon as the index files change on disk
+(mtime / size of the .npy and _chunks.pkl), so a rebuilt database never
+serves stale chunks. stats() reports hits and misses per tier (a query
+that falls through a tier is a miss there), each tier's hit rate and the
+overall hit rate.
+
+The process-wide cache from get_query_cache() is configured from
+QUERY_CACHE_SIZE (default 1024), QUERY_CACHE_TTL (seconds, default 3600)
+and QUERY_CACHE_THRESHOLD (default 0.95); QUERY_CACHE_SIZE=0 disables it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.tracing import span
+
+
+def normalize_query(query: str) -> str:
+    """Exact-tier key: lowercased, with whitespace runs collapsed."""
+    return " ".join(query.lower().split())
+
+
+def index_fingerprint(npy_file: str) -> tuple:
+    """(mtime_ns, size) of the embeddings and chunks files; changes when the index is rebuilt."""
+    chunks_file = os.path.splitext(npy_file)[0] + "_chunks.pkl"
+    fingerprint = []
+    for path in (npy_file, chunks_file):
+        try:
+            stat = os.stat(path)
+            fingerprint.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+class _Entry:
+    __slots__ = ("chunks", "scores", "k", "embedding", "created")
+
+    def __init__(self, chunks: List[str], scores: List[float], k: int, embedding: Optional[np.ndarray]):
+        self.chunks = chunks
+        self.scores = scores
+        self.k = k
+        self.embedding = embedding
+        self.created = time.monotonic()
+
+
+class _Partition:
+    """Both tiers for one (index file, embedding model)."""
+
+    def __init__(self, fingerprint: tuple):
+        self.fingerprint = fingerprint
+        self.exact: "OrderedDict[Tuple[str, int], _Entry]" = OrderedDict()
+        self.semantic: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # unit embeddings of self.semantic, in order
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.stack([entry.embedding for entry in self.semantic.values()])
+        return self._matrix
+
+    def semantic_changed(self):
+        self._matrix = None
+
+
+class SemanticQueryCache:
+    """Exact + semantic LRU/TTL cache of top-k results (see module docstring)."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._partitions: Dict[tuple, _Partition] = {}
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "exact_misses": 0, "semantic_hits": 0, "semantic_misses": 0,
+                       "evictions": 0, "invalidations": 0}
+
+    def _partition(self, npy_file: str, model) -> _Partition:
+        """Partition for an index, dropped and recreated when the index files changed (lock held)."""
+        model_key = model.cache_key() if hasattr(model, "cache_key") else (type(model).__name__,)
+        key = (os.path.abspath(npy_file),) + model_key
+        fingerprint = index_fingerprint(npy_file)
+        partition = self._partitions.get(key)
+        if partition is None or partition.fingerprint != fingerprint:
+            if partition is not None:
+                self._stats["invalidations"] += 1
+            partition = self._partitions[key] = _Partition(fingerprint)
+        return partition
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.ttl is not None and time.monotonic() - entry.created > self.ttl
+
+    def lookup_exact(self, npy_file: str, model, query: str, k: int) -> Optional[_Entry]:
+        with self._lock:
+            partition = self._partition(npy_file, model)
+            key = (normalize_query(query), k)
+            entry = partition.exact.get(key)
+            if entry is not None and self._expired(entry):
+                del partition.exact[key]
+                entry = None
+            if entry is not None:
+                partition.exact.move_to_end(key)
+                self._stats["exact_hits"] += 1
+            else:
+                self._stats["exact_misses"] += 1
+            return entry
+
+    def lookup_semantic(self, npy_file: str, model, query: str, k: int, embedding: np.ndarray) -> Optional[_Entry]:
+        """Best cached query with cosine >= threshold and at least k results; fills the exact tier on a hit."""
+        with self._lock:
+            partition = self._partition(npy_file, model)
+            expired = [text for text, entry in partition.semantic.items() if self._expired(entry)]
+            for text in expired:
+                del partition.semantic[text]
+            if expired:
+                partition.semantic_changed()
+            entry = None
+            if partition.semantic:
+                similarities = partition.matrix() @ embedding
+                items = list(partition.semantic.items())
+                for i in np.argsort(similarities)[::-1]:
+                    if similarities[i] < self.threshold:
+                        break
+                    text, candidate = items[i]
+                    if candidate.k >= k:
+                        entry = candidate
+                        partition.semantic.move_to_end(text)
+                        partition.semantic_changed()
+                        break
+            if entry is None:
+                self._stats["semantic_misses"] += 1
+                return None
+            self._stats["semantic_hits"] += 1
+            self._put_exact(partition, (normalize_query(query), k), entry)
+            return entry
+
+    def store(self, npy_file: str, model, query: str, k: int, embedding: np.ndarray,
+              chunks: List[str], scores: List[float]):
+        entry = _Entry(chunks, scores, k, embedding)
+        text = normalize_query(query)
+        with self._lock:
+            partition = self._partition(npy_file, model)
+            self._put_exact(partition, (text, k), entry)
+            partition.semantic[text] = entry
+            partition.semantic.move_to_end(text)
+            while len(partition.semantic) > self.max_entries:
+                partition.semantic.popitem(last=False)
+                self._stats["evictions"] += 1
+            partition.semantic_changed()
+
+    def _put_exact(self, partition: _Partition, key: Tuple[str, int], entry: _Entry):
+        partition.exact[key] = entry
+        partition.exact.move_to_end(key)
+        while len(partition.exact) > self.max_entries:
+            partition.exact.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, npy_file: Optional[str] = None):
+        """Drop every entry (or those of one index file)."""
+        with self._lock:
+            for key in list(self._partitions):
+                if npy_file is None or key[0] == os.path.abspath(npy_file):
+                    del self._partitions[key]
+                    self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        """
+        Hits and misses per tier with their hit rates, hit_rate over all
+        lookups (misses: queries that reached the index) and entry counts.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = sum(len(p.exact) for p in self._partitions.values())
+            stats["semantic_entries"] = sum(len(p.semantic) for p in self._partitions.values())
+        for tier in ("exact", "semantic"):
+            tried = stats[f"{tier}_hits"] + stats[f"{tier}_misses"]
+            stats[f"{tier}_hit_rate"] = stats[f"{tier}_hits"] / tried if tried else 0.0
+        stats["misses"] = stats["semantic_misses"]
+        lookups = stats["exact_hits"] + stats["exact_misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def cached_top_k(
+    npy_file: str,
+    embedding_model,
+    query: str,
+    k: int = 5,
+    cache: Optional[SemanticQueryCache] = None,
+) -> Tuple[List[str], List[float]]:
+    """
+    VectorDB.get_top_k behind the two-tier cache (the process-wide cache by default).
+
+    Returns:
+        tuple[list[str], list[float]]: top-k chunks and their scores
+    """
+    from src.embedding_db import VectorDB
+
+    cache = cache if cache is not None else get_query_cache()
+    if cache is None:
+        return VectorDB.get_top_k(npy_file, embedding_model, query, k=k)
+
+    with span("query_cache", tier="exact") as trace:
+        entry = cache.lookup_exact(npy_file, embedding_model, query, k)
+        trace.set(hit=entry is not None)
+    if entry is not None:
+        return entry.chunks[:k], entry.scores[:k]
+
+    with span("query_embedding"):
+        embedding = np.asarray(embedding_model.get_embedding(query), dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) + 1e-8)
+    with span("query_cache", tier="semantic") as trace:
+        entry = cache.lookup_semantic(npy_file, embedding_model, query, k, embedding)
+        trace.set(hit=entry is not None)
+    if entry is not None:
+        return entry.chunks[:k], entry.scores[:k]
+
+    chunks, scores = VectorDB.get_top_k(npy_file, embedding_model, query, k=k, query_embedding=embedding)
+    cache.store(npy_file, embedding_model, query, k, embedding, list(chunks), [float(s) for s in scores])
+    return chunks, scores
+
+
+_default_cache: Optional[SemanticQueryCache] = None
+_default_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[SemanticQueryCache]:
+    """Process-wide cache configured from the environment (None when QUERY_CACHE_SIZE=0)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            size = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+            if size <= 0:
+                return None
+            ttl = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+            _default_cache = SemanticQueryCache(
+                max_entries=size,
+                ttl=ttl if ttl > 0 else None,
+                threshold=float(os.getenv("QUERY_CACHE_THRESHOLD", "0.95")),
+            )
+        return _default_cache
+
+
+def invalidate_query_cache(npy_file: Optional[str] = None):
+    """Drop cached results for an index that was just rebuilt (no-op before the cache exists)."""
+    if _default_cache is not None:
+        _default_cache.invalidate(npy_file)
@@ -0,0 +1,349 @@
+# src/retrieval_bench.py
+"""
+Retrieval microbenchmark and recall regression suite.
+
+Builds synthetic corpora with deterministic random embeddings (clustered,
+unit-norm, MiniLM-sized by default) and a fixed query set per corpus size,
+then measures every backend / precision pair against exact float64 search:
+
+- build_s:    time to turn the raw embeddings into the backend's index
+- index_mb:   size of the index (in memory, or on disk for "vectordb")
+- p50_ms / p99_ms: single-query latency
+- qps:        throughput when queries are sent in batches of batch_size
+- recall:     recall@k against the exact top-k
+
+Backends:
+    vectordb  VectorDB.get_top_k end to end (np.load + pickle + per-row
+              cosine loop), float32 only and skipped above --vectordb-max
+    matrix    normalized matrix held in memory, one matrix product per
+              batch; float16 / int8 are scored block-wise in float32
+
+Results are written as JSON together with the commit, seed and machine, so
+runs can be compared across commits:
+
+    python -m src.retrieval_bench --output bench_retrieval.json
+    python -m src.retrieval_bench --compare bench_retrieval.json
+
+--compare prints the deltas per (size, backend, precision) and exits with
+status 1 when recall drops by more than --recall-tolerance.
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.embedding_db import VectorDB
+from src.embedding_models import BaseEmbeddingModel
+
+PRECISIONS = ("float32", "float16", "int8")
+SCORE_BLOCK = 65536  # corpus rows scored per block for reduced precisions and exact search
+
+
+def make_corpus(n: int, dim: int = 384, seed: int = 0, n_clusters: Optional[int] = None) -> np.ndarray:
+    """
+    Deterministic synthetic embeddings: n unit vectors drawn around random
+    cluster centroids (real sentence embeddings are clustered, uniform noise
+    would make every index look equally good). Same (n, dim, seed) -> same corpus.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = n_clusters or max(8, int(np.sqrt(n)))
+    centroids = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    corpus = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, SCORE_BLOCK):
+        stop = min(n, start + SCORE_BLOCK)
+        block_rng = np.random.default_rng([seed, start])
+        assignment = block_rng.integers(0, n_clusters, stop - start)
+        noise = block_rng.standard_normal((stop - start, dim), dtype=np.float32)
+        corpus[start:stop] = centroids[assignment] + 0.6 * noise
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    return corpus
+
+
+def make_queries(corpus: np.ndarray, n_queries: int = 200, seed: int = 0) -> np.ndarray:
+    """Fixed query set: perturbed copies of seeded corpus rows, unit-normalized."""
+    rng = np.random.default_rng([seed, len(corpus), 1])
+    rows = rng.integers(0, len(corpus), n_queries)
+    queries = corpus[rows] + 0.3 * rng.standard_normal((n_queries, corpus.shape[1]), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores per row, best first."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground truth: float64 cosine top-k, computed block-wise to bound memory."""
+    queries64 = queries.astype(np.float64)
+    best_scores = np.full((len(queries), 0), -np.inf)
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(corpus), SCORE_BLOCK):
+        block = corpus[start:start + SCORE_BLOCK].astype(np.float64)
+        block /= np.linalg.norm(block, axis=1, keepdims=True) + 1e-12
+        scores = np.concatenate([best_scores, queries64 @ block.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+        keep = _top_k_rows(scores, k)
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_ids = np.take_along_axis(ids, keep, axis=1)
+    return best_ids
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the exact top-k present in each returned top-k."""
+    hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+class MatrixIndex:
+    """In-memory normalized matrix in the given precision (int8: per-row scale)."""
+
+    def __init__(self, embeddings: np.ndarray, precision: str = "float32"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.precision = precision
+        normalized = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+        self.scale = None
+        if precision == "int8":
+            self.scale = (np.abs(normalized).max(axis=1) / 127.0 + 1e-12).astype(np.float32)
+            self.matrix = np.round(normalized / self.scale[:, None]).astype(np.int8)
+        else:
+            self.matrix = normalized.astype(precision)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def search(self, queries: np.ndarray, k: int) -> np.ndarray:
+        queries = np.atleast_2d(queries).astype(np.float32)
+        if self.precision == "float32":
+            return _top_k_rows(queries @ self.matrix.T, k)
+        # numpy has no BLAS kernels for float16 / int8: upcast one block at a time
+        scores = np.empty((len(queries), len(self.matrix)), dtype=np.float32)
+        for start in range(0, len(self.matrix), SCORE_BLOCK):
+            block = self.matrix[start:start + SCORE_BLOCK].astype(np.float32)
+            if self.scale is not None:
+                block *= self.scale[start:start + SCORE_BLOCK, None]
+            scores[:, start:start + len(block)] = queries @ block.T
+        return _top_k_rows(scores, k)
+
+
+class _PrecomputedEmbeddings(BaseEmbeddingModel):
+    """Embedding "model" returning benchmark query vectors by index, so get_top_k runs unchanged."""
+
+    def __init__(self, vectors: np.ndarray):
+        super().__init__()
+        self.vectors = vectors
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.vectors[int(text)]
+
+
+class VectorDBIndex:
+    """VectorDB.get_top_k over a database file written to a temporary folder."""
+
+    def __init__(self, embeddings: np.ndarray, precision: str = "float32"):
+        if precision != "float32":
+            raise ValueError("The vectordb backend stores float32 only")
+        self._tmp = tempfile.TemporaryDirectory(prefix="retrieval_bench_")
+        self.vector_file = os.path.join(self._tmp.name, "database.npy")
+        np.save(self.vector_file, embeddings.astype(np.float32))
+        with open(os.path.splitext(self.vector_file)[0] + "_chunks.pkl", "wb") as f:
+            pickle.dump([f"chunk {i}" for i in range(len(embeddings))], f)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self._tmp.name, name)) for name in os.listdir(self._tmp.name))
+
+    def search(self, queries: np.ndarray, k: int) -> np.ndarray:
+        # get_top_k takes one query at a time, so a "batch" is a loop
+        model = _PrecomputedEmbeddings(np.atleast_2d(queries))
+        ids = []
+        for i in range(len(model.vectors)):
+            chunks, _ = VectorDB.get_top_k(self.vector_file, model, str(i), k=k)
+            ids.append([int(chunk.split()[1]) for chunk in chunks])
+        return np.array(ids)
+
+    def close(self):
+        self._tmp.cleanup()
+
+
+BACKENDS: Dict[str, Callable[[np.ndarray, str], object]] = {
+    "vectordb": VectorDBIndex,
+    "matrix": MatrixIndex,
+}
+
+
+def bench_backend(
+    backend: str,
+    precision: str,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int = 5,
+    batch_size: int = 64,
+) -> dict:
+    """Build one index and measure it (see module docstring for the fields)."""
+    start = time.perf_counter()
+    index = BACKENDS[backend](corpus, precision)
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+
+    found = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        found.append(index.search(queries[i:i + batch_size], k))
+    batch_s = time.perf_counter() - start
+    found = np.concatenate(found)
+
+    row = {
+        "n": len(corpus),
+        "backend": backend,
+        "precision": precision,
+        "build_s": round(build_s, 4),
+        "index_mb": round(index.nbytes / 2**20, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "qps": round(len(queries) / batch_s, 1),
+        "recall": round(recall_at_k(found, truth), 4),
+    }
+    if hasattr(index, "close"):
+        index.close()
+    return row
+
+
+def _metadata(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit or "unknown",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+        "seed": args.seed,
+        "dim": args.dim,
+        "k": args.k,
+        "queries": args.queries,
+        "batch_size": args.batch_size,
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """Run every size x backend x precision combination and return {"meta", "results"}."""
+    results = []
+    for n in args.sizes:
+        start = time.perf_counter()
+        corpus = make_corpus(n, args.dim, args.seed)
+        queries = make_queries(corpus, args.queries, args.seed)
+        truth = exact_top_k(corpus, queries, args.k)
+        print(f"[RetrievalBench] n={n:,}: corpus + exact top-{args.k} in {time.perf_counter() - start:.1f}s")
+        for backend in args.backends:
+            for precision in args.precisions:
+                if backend == "vectordb" and (precision != "float32" or n > args.vectordb_max):
+                    continue
+                row = bench_backend(backend, precision, corpus, queries, truth, args.k, args.batch_size)
+                results.append(row)
+                print(f"  {backend:9s} {precision:8s} build {row['build_s']:8.3f}s  {row['index_mb']:9.1f} MB  "
+                      f"p50 {row['p50_ms']:9.3f} ms  p99 {row['p99_ms']:9.3f} ms  "
+                      f"{row['qps']:10.1f} q/s  recall@{args.k} {row['recall']:.4f}")
+        del corpus, queries, truth
+    return {"meta": _metadata(args), "results": results}
+
+
+def compare(baseline: dict, current: dict, recall_tolerance: float = 0.005) -> List[str]:
+    """
+    Print per-configuration deltas against a baseline run.
+
+    Returns:
+        List[str]: configurations whose recall dropped by more than recall_tolerance
+    """
+    key = lambda row: (row["n"], row["backend"], row["precision"])
+    old_rows = {key(row): row for row in baseline["results"]}
+    print(f"[RetrievalBench] Baseline {baseline['meta'].get('commit')} -> current {current['meta'].get('commit')}")
+    for field in ("seed", "dim", "k", "queries", "machine"):
+        if baseline["meta"].get(field) != current["meta"].get(field):
+            print(f"[RetrievalBench] Warning: {field} differs from the baseline "
+                  f"({baseline['meta'].get(field)} vs {current['meta'].get(field)}), numbers are not comparable")
+    regressions = []
+    for row in current["results"]:
+        old = old_rows.get(key(row))
+        name = f"n={row['n']:,} {row['backend']}/{row['precision']}"
+        if old is None:
+            print(f"  {name}: new configuration")
+            continue
+        ratio = lambda field: row[field] / old[field] if old[field] else float("nan")
+        recall_delta = row["recall"] - old["recall"]
+        flag = ""
+        if recall_delta < -recall_tolerance:
+            flag = "  RECALL REGRESSION"
+            regressions.append(name)
+        print(f"  {name}: p50 x{ratio('p50_ms'):.2f}  p99 x{ratio('p99_ms'):.2f}  q/s x{ratio('qps'):.2f}  "
+              f"build x{ratio('build_s'):.2f}  size x{ratio('index_mb'):.2f}  recall {recall_delta:+.4f}{flag}")
+    return regressions
+
+
+def _csv(cast):
+    return lambda text: [cast(item) for item in text.split(",") if item]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="VectorDB retrieval microbenchmark and recall suite")
+    parser.add_argument("--sizes", type=_csv(int), default=[1_000, 10_000, 100_000],
+                        help="Comma-separated corpus sizes (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--backends", type=_csv(str), default=list(BACKENDS))
+    parser.add_argument("--precisions", type=_csv(str), default=list(PRECISIONS))
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vectordb-max", type=int, default=10_000,
+                        help="Largest corpus run through the per-row VectorDB loop")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--recall-tolerance", type=float, default=0.005)
+    args = parser.parse_args(argv)
+
+    unknown = [b for b in args.backends if b not in BACKENDS] + [p for p in args.precisions if p not in PRECISIONS]
+    if unknown:
+        parser.error(f"Unknown backend / precision: {', '.join(unknown)}")
+
+    baseline = None
+    if args.compare:  # read first: --output may overwrite the same file
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = run_benchmark(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[RetrievalBench] Results saved to {args.output}")
+    if baseline is not None:
+        regressions = compare(baseline, report, args.recall_tolerance)
+        if regressions:
+            print(f"[RetrievalBench] Recall regressed for {len(regressions)} configuration(s)")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,303 @@
+# src/retrieval_service.py
+"""
+Local retrieval service: named VectorDB collections behind one shared
+embedding model, with dynamic micro-batching of concurrent queries.
+
+    python -m src.retrieval_service --collection default=database.npy --port 8765
+    python -m src.retrieval_service --collection default=database.npy --socket /tmp/retrieval.sock
+
+    client = RetrievalClient("http://127.0.0.1:8765")   # or "unix:///tmp/retrieval.sock"
+    chunks, scores = client.get_top_k("array sum", k=3)
+
+Requests that arrive within `window` seconds of the first waiting one (up
+to max_batch) are answered together: one get_embeddings_batch call for all
+their texts, then one matrix product per collection over pre-normalized
+embeddings. Each caller still gets only its own top-k. A collection is
+reloaded when its files change on disk (same fingerprint as the query cache).
+
+Endpoints: POST /query {"query", "k", "collection"} -> {"chunks", "scores"},
+GET /collections, GET /stats. main_workflow uses the service when
+RETRIEVAL_SERVICE_URL is set.
+"""
+import http.client
+import json
+import os
+import pickle
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from src.query_cache import index_fingerprint
+from src.tracing import span
+
+
+class Collection:
+    """One VectorDB index held in memory as a unit-normalized float32 matrix."""
+
+    def __init__(self, name: str, npy_file: str):
+        self.name = name
+        self.npy_file = npy_file
+        self.fingerprint = None
+        self.reload()
+
+    def reload(self):
+        self.fingerprint = index_fingerprint(self.npy_file)
+        embeddings = np.load(self.npy_file).astype(np.float32)
+        with open(os.path.splitext(self.npy_file)[0] + "_chunks.pkl", "rb") as f:
+            self.chunks: List[str] = pickle.load(f)
+        self.matrix = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+        print(f"[RetrievalService] Loaded '{self.name}': {len(self.chunks)} chunks from {self.npy_file}")
+
+    def refresh(self):
+        """Reload if the index was rebuilt since it was loaded."""
+        if index_fingerprint(self.npy_file) != self.fingerprint:
+            self.reload()
+
+    def search(self, query_vecs: np.ndarray, ks: List[int]) -> List[Tuple[List[str], List[float]]]:
+        """Top-k for each row of query_vecs (unit vectors) with one matrix product."""
+        scores = query_vecs @ self.matrix.T
+        results = []
+        for row, k in zip(scores, ks):
+            k = min(k, len(row))
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append(([self.chunks[i] for i in top], [float(row[i]) for i in top]))
+        return results
+
+
+class MicroBatcher:
+    """Coalesces concurrent queries into batched embedding + search calls."""
+
+    def __init__(self, collections: Dict[str, Collection], embedding_model=None,
+                 window: float = 0.005, max_batch: int = 64):
+        self.collections = collections
+        self._embedding_model = embedding_model
+        self.window = window
+        self.max_batch = max_batch
+        self._requests: "queue.Queue[tuple]" = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="retrieval-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            from src.embedding_models import get_default_embedding_model
+            self._embedding_model = get_default_embedding_model()
+        return self._embedding_model
+
+    def submit(self, query: str, k: int = 5, collection: str = "default") -> Future:
+        """Queue one query; the Future resolves to (chunks, scores)."""
+        if collection not in self.collections:
+            raise KeyError(f"Unknown collection: {collection}")
+        future: Future = Future()
+        self._requests.put((query, k, collection, future))
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._run(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run(self, batch: List[tuple]):
+        with self._stats_lock:
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        with span("service_embedding", batch=len(batch)):
+            vectors = np.atleast_2d(np.asarray(self.embedding_model.get_embeddings_batch([q for q, *_ in batch]),
+                                               dtype=np.float32))
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-8
+        by_collection: Dict[str, List[int]] = {}
+        for i, (_, _, name, _) in enumerate(batch):
+            by_collection.setdefault(name, []).append(i)
+        for name, rows in by_collection.items():
+            collection = self.collections[name]
+            with span("service_search", collection=name, batch=len(rows)):
+                collection.refresh()
+                results = collection.search(vectors[rows], [batch[i][1] for i in rows])
+            for i, result in zip(rows, results):
+                batch[i][3].set_result(result)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["mean_batch"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+
+class _Handler(BaseHTTPRequestHandler):
+    batcher: MicroBatcher = None  # set on the per-server subclass
+    protocol_version = "HTTP/1.1"  # keep-alive: clients reuse one connection per thread
+
+    def address_string(self) -> str:
+        # Unix socket peers have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/collections":
+            self._reply(200, {name: len(c.chunks) for name, c in self.batcher.collections.items()})
+        elif self.path == "/stats":
+            self._reply(200, self.batcher.get_stats())
+        else:
+            self._reply(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._reply(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            future = self.batcher.submit(request["query"], int(request.get("k", 5)),
+                                         request.get("collection", "default"))
+        except (KeyError, ValueError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        try:
+            chunks, scores = future.result()
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, {"chunks": chunks, "scores": scores})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _TCPHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # many agents connecting at once
+
+
+def make_server(batcher: MicroBatcher, host: str = "127.0.0.1", port: int = 8765,
+                socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """HTTP server (TCP, or a Unix socket when socket_path is given) answering through batcher."""
+    handler = type("RetrievalHandler", (_Handler,), {"batcher": batcher})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return _UnixHTTPServer(socket_path, handler)
+    return _TCPHTTPServer((host, port), handler)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RetrievalClient:
+    """Client for the service: "http://host:port" or "unix:///path/to.sock"."""
+
+    def __init__(self, url: Optional[str] = None, timeout: float = 30.0):
+        self.url = url or os.getenv("RETRIEVAL_SERVICE_URL", "http://127.0.0.1:8765")
+        self.timeout = timeout
+        self._parsed = urlparse(self.url)
+        self._local = threading.local()  # one keep-alive connection per thread
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self._parsed.scheme == "unix":
+                connection = _UnixHTTPConnection(self._parsed.path, self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self._parsed.hostname, self._parsed.port or 80,
+                                                        timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=data, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                result = json.loads(response.read() or b"{}")
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # stale keep-alive connection: reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval service error {response.status}: {result.get('error')}")
+        return result
+
+    def get_top_k(self, query: str, k: int = 5, collection: str = "default") -> Tuple[List[str], List[float]]:
+        result = self._request("POST", "/query", {"query": query, "k": k, "collection": collection})
+        return result["chunks"], result["scores"]
+
+    def stats(self) -> dict:
+        return self._request("GET", "/stats")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve VectorDB collections with micro-batched queries")
+    parser.add_argument("--collection", action="append", default=[],
+                        help="name=path/to/database.npy (repeatable; default: default=database.npy)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Serve on this Unix socket instead of TCP")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Batching window after the first queued query")
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    specs = args.collection or ["default=database.npy"]
+    collections = {}
+    for spec in specs:
+        name, _, path = spec.partition("=")
+        collections[name] = Collection(name, path)
+    service = MicroBatcher(collections, window=args.window_ms / 1000, max_batch=args.max_batch)
+    server = make_server(service, args.host, args.port, args.socket)
+    where = f"unix://{args.socket}" if args.socket else f"http://{args.host}:{args.port}"
+    print(f"[RetrievalService] Serving {', '.join(collections)} on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,111 @@
+# src/task_bundle.py
+"""
+Preloaded task data with a pre-split Lean template.
+
+A TaskBundle reads a task folder once (description.txt, signature.json,
+task.lean, tests.lean, test.json) and splits the template at its {{code}}
+and {{proof}} slots. render() then builds each candidate program with one
+join over the fixed parts instead of chained str.replace calls over the
+whole template. Bundles are cached per task path and per template text, so
+repeated attempts and checks reuse them for the rest of the run.
+"""
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+_SLOT = re.compile(r"(\{\{code\}\}|\{\{proof\}\})")
+
+_bundles_by_path: Dict[str, "TaskBundle"] = {}
+_bundles_by_template: Dict[str, "TaskBundle"] = {}
+_lock = threading.Lock()
+
+
+def _read(path: str, default: Optional[str] = None) -> Optional[str]:
+    if default is not None and not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class TaskBundle:
+    """One task's files, loaded once, with the template split at its slots."""
+
+    def __init__(
+        self,
+        template: str,
+        description: str = "",
+        signature: Optional[dict] = None,
+        unit_tests: str = "",
+        test_cases: Optional[List[dict]] = None,
+        task_path: Optional[str] = None,
+    ):
+        self.template = template
+        self.description = description
+        self.signature = signature or {}
+        self.unit_tests = unit_tests
+        self.test_cases = test_cases or []
+        self.task_path = task_path
+        # Literal template text at even indices, slot names ("code"/"proof") at odd ones
+        pieces = _SLOT.split(template)
+        self._parts = [piece if i % 2 == 0 else piece[2:-2] for i, piece in enumerate(pieces)]
+        # The usual shape, one {{code}} then one {{proof}}, renders with plain concatenation
+        self._simple = self._parts[1::2] == ["code", "proof"]
+
+    @classmethod
+    def from_path(cls, task_path: str) -> "TaskBundle":
+        """Read a task folder (no caching; see load_task_bundle)."""
+        test_json = _read(os.path.join(task_path, "test.json"), default="")
+        signature_json = _read(os.path.join(task_path, "signature.json"), default="")
+        return cls(
+            template=_read(os.path.join(task_path, "task.lean")),
+            description=_read(os.path.join(task_path, "description.txt")),
+            signature=json.loads(signature_json) if signature_json else None,
+            unit_tests=_read(os.path.join(task_path, "tests.lean"), default=""),
+            test_cases=json.loads(test_json) if test_json else None,
+            task_path=task_path,
+        )
+
+    def render(self, code: str, proof: str = "sorry", with_tests: bool = False) -> str:
+        """
+        Assemble a candidate program from the pre-split template.
+
+        Args:
+            code: Text for the {{code}} slot
+            proof: Text for the {{proof}} slot ("sorry" for implementation-only checks)
+            with_tests: Append the task's unit tests (tests.lean)
+
+        Returns:
+            str: The complete Lean program
+        """
+        parts = self._parts
+        if self._simple:
+            program = parts[0] + code + parts[2] + proof + parts[4]
+        else:
+            slots = {"code": code, "proof": proof}
+            program = "".join(part if i % 2 == 0 else slots[part] for i, part in enumerate(parts))
+        if with_tests and self.unit_tests:
+            program += f"\n\n{self.unit_tests}"
+        return program
+
+
+def load_task_bundle(task_path: str) -> TaskBundle:
+    """Bundle for a task folder, read from disk on the first call only."""
+    key = os.path.normpath(task_path)
+    bundle = _bundles_by_path.get(key)
+    if bundle is None:
+        bundle = TaskBundle.from_path(task_path)
+        with _lock:
+            bundle = _bundles_by_path.setdefault(key, bundle)
+            _bundles_by_template.setdefault(bundle.template, bundle)
+    return bundle
+
+
+def bundle_for_template(template: str) -> TaskBundle:
+    """Bundle for a template string (the one loaded from its folder, if any)."""
+    bundle = _bundles_by_template.get(template)
+    if bundle is None:
+        with _lock:
+            bundle = _bundles_by_template.setdefault(template, TaskBundle(template))
+    return bundle
@@ -0,0 +1,177 @@
+# src/tracing.py
+"""
+Lightweight per-stage tracing for the generation pipeline.
+
+    from src.tracing import span
+    with span("llm_request", model=self.model):
+        ...
+
+Tracing is off unless LEAN_TRACE=1 is set or enable_tracing() is called.
+When it is off, span() returns one shared no-op context manager, so an
+instrumented call costs a function call and an attribute check.
+
+When it is on, every span records its name, start, duration, thread and
+attributes. histograms() summarizes durations per stage (count, total,
+p50/p90/p99, max), export_chrome_trace() writes a file for
+chrome://tracing or https://ui.perfetto.dev, and export_json() writes the
+raw spans plus the summary. With LEAN_TRACE_FILE set, tests.py writes the
+Chrome trace there after a run.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+_enabled = os.getenv("LEAN_TRACE", "") not in ("", "0", "false", "False")
+_spans: List[dict] = []
+_lock = threading.Lock()
+_origin_ns = time.perf_counter_ns()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start_ns")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record = {
+            "name": self.name,
+            "start_ns": self.start_ns - _origin_ns,
+            "duration_ns": end_ns - self.start_ns,
+            "thread": threading.get_ident(),
+            "attrs": self.attrs,
+        }
+        with _lock:
+            _spans.append(record)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only inside the span (e.g. the outcome)."""
+        self.attrs.update(attrs)
+
+
+def enable_tracing(enabled: bool = True):
+    """Turn span recording on or off for this process."""
+    global _enabled
+    _enabled = enabled
+
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attrs):
+    """Context manager timing one pipeline stage (a no-op while tracing is off)."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def get_spans() -> List[dict]:
+    with _lock:
+        return list(_spans)
+
+
+def reset_tracing():
+    """Drop all recorded spans."""
+    with _lock:
+        _spans.clear()
+
+
+def _percentile(sorted_values: List[int], q: float) -> int:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def histograms() -> Dict[str, dict]:
+    """
+    Duration summary per span name.
+
+    Returns:
+        Dict[str, dict]: name -> count, total_ms, p50_ms, p90_ms, p99_ms, max_ms
+    """
+    durations: Dict[str, List[int]] = {}
+    for record in get_spans():
+        durations.setdefault(record["name"], []).append(record["duration_ns"])
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "total_ms": sum(values) / 1e6,
+            "p50_ms": _percentile(values, 0.50) / 1e6,
+            "p90_ms": _percentile(values, 0.90) / 1e6,
+            "p99_ms": _percentile(values, 0.99) / 1e6,
+            "max_ms": values[-1] / 1e6,
+        }
+    return summary
+
+
+def print_histograms():
+    """Print the per-stage summary, slowest total first."""
+    summary = histograms()
+    if not summary:
+        print("[Tracing] No spans recorded (set LEAN_TRACE=1)")
+        return
+    width = max(len(name) for name in summary)
+    print(f"{'stage'.ljust(width)}  count   total ms     p50 ms     p90 ms     p99 ms     max ms")
+    for name, s in sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+        print(f"{name.ljust(width)}  {s['count']:5d} {s['total_ms']:10.1f} {s['p50_ms']:10.1f} "
+              f"{s['p90_ms']:10.1f} {s['p99_ms']:10.1f} {s['max_ms']:10.1f}")
+
+
+def export_chrome_trace(path: str):
+    """Write the spans in Chrome trace event format (complete "X" events, microseconds)."""
+    pid = os.getpid()
+    events = [
+        {
+            "name": record["name"],
+            "ph": "X",
+            "ts": record["start_ns"] / 1000,
+            "dur": record["duration_ns"] / 1000,
+            "pid": pid,
+            "tid": record["thread"],
+            "args": {k: str(v) for k, v in record["attrs"].items()},
+        }
+        for record in get_spans()
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"[Tracing] Chrome trace with {len(events)} span(s) saved to {path}")
+
+
+def export_json(path: str, extra: Optional[dict] = None):
+    """Write the raw spans and the per-stage histograms as JSON."""
+    data = {"spans": get_spans(), "histograms": histograms()}
+    if extra:
+        data.update(extra)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
+    print(f"[Tracing] Spans and histograms saved to {path}")
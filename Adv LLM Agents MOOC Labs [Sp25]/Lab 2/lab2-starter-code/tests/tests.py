@@ -1,5 +1,11 @@
-from src.main import main_workflow, get_problem_and_code_from_taskpath, get_unit_tests_from_taskpath, get_task_lean_template_from_taskpath
+from src.agents import export_routing_stats, print_routing_stats
+from src.main import main_workflow
+from src.native_tests import run_native_tests, use_native_tests
+from src.task_bundle import load_task_bundle
 from src.lean_runner import execute_lean_code
+from src.query_cache import get_query_cache
+from src.tracing import export_chrome_trace, print_histograms, span, tracing_enabled
+import os
 import re
 import time
 
@@ -24,18 +30,20 @@ def test_all_tasks():
         
         # Reading the problem description and the Lean code template
         print(f"Reading problem description and code template from {task_folder_prefix + task_id}...")
-        problem_description, lean_code_template = get_problem_and_code_from_taskpath(task_folder_prefix + task_id)
+        bundle = load_task_bundle(task_folder_prefix + task_id)
+        problem_description, lean_code_template = bundle.description, bundle.template
         print(f"Problem description length: {len(problem_description)} characters")
         
         # Reading the unit tests
         print(f"Reading unit tests...")
-        unit_tests = get_unit_tests_from_taskpath(task_folder_prefix + task_id)
+        unit_tests = bundle.unit_tests
         print(f"Unit tests length: {len(unit_tests)} characters")
                 
         # Running the main workflow
         print(f"Running main workflow to generate solution...")
         start_time = time.time()
-        generated_solution = main_workflow(problem_description, lean_code_template)
+        with span("main_workflow", task_id=task_id):
+            generated_solution = main_workflow(problem_description, lean_code_template)
         end_time = time.time()
         runtime = end_time - start_time
         testing_metadata[task_id]["runtime"] = runtime
@@ -46,36 +54,42 @@ def test_all_tasks():
         print(f"Generated code length: {len(generated_code)} characters")
         print(f"Generated proof length: {len(generated_proof)} characters")
         
-        # Reading the task lean template, and putting the code and proof into the template.
-        print(f"Loading Lean template and inserting generated solution...")
-        task_lean_template_only_implementation = get_task_lean_template_from_taskpath(task_folder_prefix + task_id)
-        task_lean_template_implementation_and_proof = get_task_lean_template_from_taskpath(task_folder_prefix + task_id)
-
+        # Putting the code and proof into the task's pre-split Lean template.
+        print(f"Inserting generated solution into the Lean template...")
         
+        # Large suites run through a natively compiled driver (src/native_tests.py); the
+        # #guard lines stay in the templates when it is not used or cannot build the task.
+        native_result = run_native_tests(bundle, generated_code) if use_native_tests(bundle) else None
+        use_guards = native_result is None or native_result["outcome"] not in ("success", "failed")
+        if native_result is not None:
+            if use_guards:
+                print(f"Native unit tests unavailable ({native_result['outcome']}), using #guard tests")
+            else:
+                print(f"Native unit tests: {native_result['passed']} passed, {native_result['failed']} failed")
+
         # Replacing the proof with a sorry for this template, only checking if the implementation is correct.
-        task_lean_template_only_implementation = task_lean_template_only_implementation.replace("{{code}}", generated_code)
-        task_lean_template_only_implementation = task_lean_template_only_implementation.replace("{{proof}}", "sorry")
+        task_lean_template_only_implementation = bundle.render(generated_code, "sorry", with_tests=use_guards)
 
         # Testing both the proof and the implementation
-        task_lean_template_implementation_and_proof = task_lean_template_implementation_and_proof.replace("{{code}}", generated_code)
-        task_lean_template_implementation_and_proof = task_lean_template_implementation_and_proof.replace("{{proof}}", generated_proof)
+        task_lean_template_implementation_and_proof = bundle.render(generated_code, generated_proof, with_tests=use_guards)
         
         
         # Executing the lean code
         print(f"Executing Lean code with implementation only (proof=sorry)...")
-        lean_output_only_implementation = execute_lean_code(task_lean_template_only_implementation + f"\n\n{unit_tests}")
+        lean_output_only_implementation = execute_lean_code(task_lean_template_only_implementation)
         print(f"Implementation test result: {'PASS' if 'executed successfully' in lean_output_only_implementation else 'FAIL'}")
         if "Lean Error" in lean_output_only_implementation:
             print(f"Implementation error: {lean_output_only_implementation.split('Lean Error:')[1].strip()[:150]}...")
         
         print(f"Executing Lean code with implementation and proof...")
-        lean_output_implementation_and_proof = execute_lean_code(task_lean_template_implementation_and_proof + f"\n\n{unit_tests}")
+        lean_output_implementation_and_proof = execute_lean_code(task_lean_template_implementation_and_proof)
         print(f"Full solution test result: {'PASS' if 'executed successfully' in lean_output_implementation_and_proof else 'FAIL'}")
         if "Lean Error" in lean_output_implementation_and_proof:
             print(f"Proof error: {lean_output_implementation_and_proof.split('Lean Error:')[1].strip()[:150]}...")
         
         # Update testing metadata based on results
-        if "executed successfully" in lean_output_only_implementation and "sorry" not in generated_code:
+        native_ok = use_guards or native_result["outcome"] == "success"
+        if "executed successfully" in lean_output_only_implementation and "sorry" not in generated_code and native_ok:
             testing_metadata[task_id]["passes_unit_tests"] = True
             print("✅ Implementation passes unit tests")
         else:
@@ -97,6 +111,26 @@ def test_all_tasks():
         print(f"  Runtime: {metadata['runtime']} seconds")
         print(f"---")
     
+    # Per-stage breakdown (only when tracing is on: LEAN_TRACE=1)
+    if tracing_enabled():
+        print_histograms()
+        if os.getenv("LEAN_TRACE_FILE"):
+            export_chrome_trace(os.getenv("LEAN_TRACE_FILE"))
+
+    # Retrieval cache effectiveness (only when live VectorDB queries ran)
+    query_cache = get_query_cache()
+    stats = query_cache.stats() if query_cache is not None else {}
+    if stats.get("exact_hits") or stats.get("exact_misses"):
+        print(f"Query cache: exact tier {stats['exact_hits']} hits / {stats['exact_misses']} misses "
+              f"({stats['exact_hit_rate']:.0%}), semantic tier {stats['semantic_hits']} hits / "
+              f"{stats['semantic_misses']} misses ({stats['semantic_hit_rate']:.0%}), "
+              f"overall hit rate {stats['hit_rate']:.0%}")
+
+    # Model cascade routing (which tier solved what), for tuning CASCADE_MODELS / CASCADE_ESCALATE_AFTER
+    print_routing_stats()
+    if os.getenv("CASCADE_STATS_FILE"):
+        export_routing_stats(os.getenv("CASCADE_STATS_FILE"))
+    
     return testing_metadata
         
 
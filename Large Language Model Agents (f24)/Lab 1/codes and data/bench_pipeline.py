@@ -0,0 +1,230 @@
+"""
+Throughput and scaling benchmark for the restaurant scoring pipeline.
+
+    python bench_pipeline.py --restaurants 100000 --reviews 2000000
+    python bench_pipeline.py --data synthetic-data.txt --output bench.json
+
+Generates a synthetic dataset (synthetic_data.py) unless --data is given,
+points main.py at it (RESTAURANT_DATA_FILE, with a throwaway score cache)
+and the agents at the local mock LLM (mock_llm.py), then measures:
+
+- load:    load_restaurant_data cold and warm, RSS growth and peak RSS
+- names:   name index build, extract_restaurant_name latency per query kind
+           (exact, variant spelling, partial name, unknown restaurant)
+- fetch:   fetch_restaurant_data latency per query kind
+- scoring: keyword scoring throughput (reviews/s), score table build,
+           score_many queries/s
+- agents:  RestaurantScoringService end to end against the mock LLM
+           (queries/s, LLM calls per query)
+
+Everything runs in one process so memory numbers include the whole data path.
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def latency_summary(fn: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    """Per-call latency of fn over queries: p50/p99/max in ms and calls per second."""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3),
+        "per_s": round(len(timings) / sum(timings), 1) if sum(timings) else 0.0,
+    }
+
+
+def make_queries(names: List[str], n: int, seed: int = 0) -> Dict[str, List[str]]:
+    """Restaurant names as a user might type them, per kind, drawn from the dataset's names."""
+    import random
+    rng = random.Random(seed)
+    sample = [rng.choice(names) for _ in range(n)]
+    return {
+        "exact": sample,
+        "variant": [name.lower().replace("'", "").replace("&", "and") for name in sample],
+        "partial": [" ".join(name.split()[:2]) for name in sample],
+        "unknown": [f"Zq{rng.randrange(10**6)} Vexillum Palace" for _ in sample],
+    }
+
+
+def as_questions(names: List[str]) -> List[str]:
+    return [f"What is the overall score for {name}?" for name in names]
+
+
+def run(args: argparse.Namespace) -> dict:
+    report: Dict[str, object] = {"config": vars(args).copy()}
+    workdir = tempfile.mkdtemp(prefix="restaurant_bench_")
+    data_file = args.data or os.path.join(workdir, "synthetic-data.txt")
+
+    # main.py reads these at import time (synthetic_data imports it too)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    os.environ["RESTAURANT_DATA_FILE"] = os.path.abspath(data_file)
+    os.environ["RESTAURANT_SCORE_CACHE"] = os.path.join(workdir, "scores.cache.json")
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ["GROQ_API_KEY"] = os.environ.get("GROQ_API_KEY") or "mock"  # the mock ignores it
+    import main
+    from mock_llm import start_mock_server
+
+    if args.data is None:
+        from synthetic_data import generate
+        report["dataset"] = generate(data_file, args.restaurants, args.reviews, args.ambiguous, seed=args.seed)
+        print(f"[bench] Generated {report['dataset']['reviews']:,} reviews in {report['dataset']['seconds']}s")
+
+    # ---- load ----
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    data = main.load_restaurant_data()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    main.load_restaurant_data()
+    warm = time.perf_counter() - start
+    n_reviews = sum(len(reviews) for reviews in data.values())
+    report["load"] = {
+        "restaurants": len(data),
+        "reviews": n_reviews,
+        "cold_s": round(cold, 3),
+        "warm_ms": round(warm * 1000, 3),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+    }
+
+    # ---- name resolution ----
+    names = list(data)
+    typed = make_queries(names, args.queries, args.seed)
+    queries = {kind: as_questions(batch) for kind, batch in typed.items()}
+    start = time.perf_counter()
+    main.get_name_index()
+    report["names"] = {"index_build_s": round(time.perf_counter() - start, 3)}
+    for kind, batch in queries.items():
+        report["names"][kind] = latency_summary(main.extract_restaurant_name, batch)
+
+    # ---- fetch (linear scans over all names, so fewer calls) ----
+    report["fetch"] = {}
+    for kind, batch in typed.items():
+        report["fetch"][kind] = latency_summary(main.fetch_restaurant_data, batch[:args.fetch_queries])
+
+    # ---- scoring ----
+    reviews = [review for batch in data.values() for review in batch][:args.score_reviews]
+    start = time.perf_counter()
+    for review in reviews:
+        main.fallback_score_review(review)
+    keyword_s = time.perf_counter() - start
+    start = time.perf_counter()
+    main.get_score_table()
+    table_s = time.perf_counter() - start
+    start = time.perf_counter()
+    main.get_score_table()
+    table_warm = time.perf_counter() - start
+    mixed = [q for batch in queries.values() for q in batch[:args.fetch_queries]]
+    start = time.perf_counter()
+    answers = main.score_many(mixed)
+    score_many_s = time.perf_counter() - start
+    report["scoring"] = {
+        "keyword_reviews_per_s": round(len(reviews) / keyword_s, 1) if keyword_s else 0.0,
+        "score_table_build_s": round(table_s, 3),
+        "score_table_warm_ms": round(table_warm * 1000, 3),
+        "score_many_per_s": round(len(mixed) / score_many_s, 1) if score_many_s else 0.0,
+        "score_many_answered": sum(1 for a in answers if a),
+    }
+
+    # ---- agents against the mock LLM ----
+    if args.agent_queries:
+        server = start_mock_server(port, latency=args.mock_latency)
+        try:
+            agent_queries = [q for batch in queries.values() for q in batch[:max(1, args.agent_queries // 4)]]
+            with main.RestaurantScoringService(max_workers=args.workers) as service:
+                start = time.perf_counter()
+                results = service.answer_many(agent_queries)
+                elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+        report["agents"] = {
+            "queries": len(agent_queries),
+            "per_s": round(len(agent_queries) / elapsed, 2) if elapsed else 0.0,
+            "llm_calls_per_query": round(sum(r["llm_calls"] for r in results) / len(results), 2),
+            "found": sum(1 for r in results if r["restaurant"]),
+            "mean_total_ms": round(statistics.mean(r["timings"]["total"] for r in results) * 1000, 2),
+        }
+
+    report["memory"] = {"rss_mb": round(rss_mb(), 1), "peak_rss_mb": round(peak_rss_mb(), 1)}
+    return report
+
+
+def print_report(report: dict):
+    load = report["load"]
+    print(f"\nload: {load['restaurants']:,} restaurants, {load['reviews']:,} reviews in {load['cold_s']}s "
+          f"(warm {load['warm_ms']} ms), +{load['rss_growth_mb']} MB RSS")
+    for section in ("names", "fetch"):
+        extra = f" (index build {report[section]['index_build_s']}s)" if "index_build_s" in report[section] else ""
+        print(f"{section}{extra}:")
+        for kind, s in report[section].items():
+            if isinstance(s, dict):
+                print(f"  {kind:8s} p50 {s['p50_ms']:9.3f} ms  p99 {s['p99_ms']:9.3f} ms  "
+                      f"max {s['max_ms']:9.3f} ms  {s['per_s']:10.1f}/s")
+    scoring = report["scoring"]
+    print(f"scoring: {scoring['keyword_reviews_per_s']:,.0f} reviews/s keyword, table build "
+          f"{scoring['score_table_build_s']}s (warm {scoring['score_table_warm_ms']} ms), "
+          f"score_many {scoring['score_many_per_s']:,.1f} queries/s")
+    if "agents" in report:
+        agents = report["agents"]
+        print(f"agents: {agents['queries']} queries at {agents['per_s']}/s, "
+              f"{agents['llm_calls_per_query']} LLM calls/query, {agents['found']} found, "
+              f"mean {agents['mean_total_ms']} ms")
+    memory = report["memory"]
+    print(f"memory: {memory['rss_mb']} MB RSS, peak {memory['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the restaurant scoring data path")
+    parser.add_argument("--data", help="Existing data file (default: generate one)")
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--ambiguous", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=2000, help="name-resolution queries per kind")
+    parser.add_argument("--fetch-queries", type=int, default=50, help="fetch / score_many queries per kind")
+    parser.add_argument("--score-reviews", type=int, default=500_000, help="reviews for the keyword throughput")
+    parser.add_argument("--agent-queries", type=int, default=40, help="0 skips the agent pipeline")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="seconds per mock LLM reply")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Report saved to {args.output}")
@@ -2,16 +2,22 @@ import os
 import sys
 import math
 import re
-from typing import Dict, List
+import json
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
 from autogen import ConversableAgent
 
-# Configuration for Groq API
+# Configuration for Groq API (LLM_BASE_URL points it at another
+# OpenAI-compatible endpoint, e.g. the local mock in mock_llm.py)
 llm_config = {
     "config_list": [
         {
             "model": "llama-3.3-70b-versatile",
             "api_key": os.environ.get("GROQ_API_KEY"),
-            "base_url": "https://api.groq.com/openai/v1",
+            "base_url": os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1"),
         }
     ],
     "cache_seed": None,
@@ -23,9 +29,27 @@ llm_config = {
 def normalize(s: str) -> str:
     return s.strip().lower()
 
-def load_restaurant_data() -> Dict[str, List[str]]:
-    """Load all restaurant data from file"""
-    data_file = os.path.join(os.path.dirname(__file__), "restaurant-data.txt")
+# RESTAURANT_DATA_FILE / RESTAURANT_SCORE_CACHE point the pipeline at another
+# dataset (e.g. one written by synthetic_data.py) without touching the real one
+DATA_FILE = os.environ.get("RESTAURANT_DATA_FILE") or os.path.join(os.path.dirname(__file__), "restaurant-data.txt")
+SCORE_CACHE_FILE = os.environ.get("RESTAURANT_SCORE_CACHE") or os.path.join(os.path.dirname(__file__), "restaurant-scores.cache.json")
+
+# Parsed data keyed by data-file fingerprint, so repeated lookups skip the file
+_data_cache: Dict[str, object] = {"fingerprint": None, "data": None}
+
+
+def data_fingerprint(data_file: str = DATA_FILE) -> List[int]:
+    """Cheap change detector for the data file: [mtime_ns, size]."""
+    stat = os.stat(data_file)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_restaurant_data(data_file: str = DATA_FILE) -> Dict[str, List[str]]:
+    """Load all restaurant data from file (cached until the file changes)"""
+    fingerprint = [data_file] + data_fingerprint(data_file)
+    if _data_cache["fingerprint"] == fingerprint:
+        return _data_cache["data"]
+
     data = {}
     
     with open(data_file, "r", encoding="utf-8") as f:
@@ -40,6 +64,8 @@ def load_restaurant_data() -> Dict[str, List[str]]:
             review = parts[1].strip()
             data.setdefault(rest_name, []).append(review)
     
+    _data_cache["fingerprint"] = fingerprint
+    _data_cache["data"] = data
     return data
 
 # ==================== TASK 1: FETCH RESTAURANT DATA ====================
@@ -79,6 +105,183 @@ def fetch_restaurant_data(restaurant_name: str) -> Dict[str, List[str]]:
     return {}
 
 
+# ==================== LOCAL NAME EXTRACTION ====================
+
+# Below this confidence main() asks the entrypoint agent instead
+NAME_CONFIDENCE_THRESHOLD = 0.8
+
+_name_index_cache: Dict[str, object] = {"fingerprint": None, "index": None}
+
+
+def name_tokens(s: str) -> List[str]:
+    """Normalized tokens, as used by fetch_restaurant_data's fuzzy match."""
+    return re.findall(r'[a-z0-9]+', normalize(s))
+
+
+def build_name_index(names: List[str]) -> Dict[str, object]:
+    """
+    Index restaurant names by their token tuple and by their tokens joined
+    without separators, so "In N Out" finds "In-n-Out" and "mcdonalds" finds
+    "McDonald's".
+    """
+    exact: Dict[Tuple[str, ...], str] = {}
+    joined: Dict[str, str] = {}
+    tokens: Dict[str, List[str]] = {}
+    for name in names:
+        toks = name_tokens(name)
+        if not toks:
+            continue
+        exact[tuple(toks)] = name
+        joined["".join(toks)] = name
+        tokens[name] = toks
+    max_n = max((len(t) for t in tokens.values()), default=0)
+    return {"exact": exact, "joined": joined, "tokens": tokens, "max_n": max_n}
+
+
+def get_name_index() -> Dict[str, object]:
+    """Name index for the current data file, rebuilt when the file changes."""
+    fingerprint = data_fingerprint()
+    if _name_index_cache["fingerprint"] != fingerprint:
+        _name_index_cache["index"] = build_name_index(list(load_restaurant_data().keys()))
+        _name_index_cache["fingerprint"] = fingerprint
+    return _name_index_cache["index"]
+
+
+def match_restaurant_names(user_query: str) -> Tuple[List[str], float]:
+    """
+    Find the known restaurant names a free-form query refers to, without
+    calling the LLM. Scans the query's token n-grams (longest first) against
+    the name index. Returns (names, confidence): every equally good match,
+    sorted, and 1.0 for a single full-name match, lower for ambiguous or
+    partial (token overlap) matches, ([], 0.0) for none.
+    """
+    index = get_name_index()
+    q = name_tokens(user_query)
+
+    # Full-name matches, longest n-gram first; a longer name wins over any
+    # name inside its span ("Taco Bell Cantina" over "Taco Bell"), but names
+    # elsewhere in the query ("Subway vs Chipotle") all count
+    found = set()
+    covered = [False] * len(q)
+    for n in range(min(len(q), index["max_n"] + 1), 0, -1):
+        for i in range(len(q) - n + 1):
+            if all(covered[i:i + n]):
+                continue
+            gram = q[i:i + n]
+            name = index["exact"].get(tuple(gram)) or index["joined"].get("".join(gram))
+            if name:
+                found.add(name)
+                covered[i:i + n] = [True] * n
+    if len(found) == 1:
+        return [found.pop()], 1.0
+    if found:
+        return sorted(found), 0.5
+
+    # Partial match: share of the name's tokens present in the query
+    q_set = set(q)
+    best: List[str] = []
+    best_score = 0.0
+    for name, toks in index["tokens"].items():
+        score = len(q_set.intersection(toks)) / len(toks)
+        if score > best_score:
+            best, best_score = [name], score
+        elif score == best_score and score > 0:
+            best.append(name)
+    if len(best) > 1:
+        best_score /= 2
+    return sorted(best), best_score
+
+
+def extract_restaurant_name(user_query: str) -> Tuple[str, float]:
+    """
+    Best single restaurant name for a query: (restaurant_name, confidence)
+    as in match_restaurant_names, ("", 0.0) for none. When several names
+    match equally well the first one is returned with the lower confidence.
+    """
+    names, confidence = match_restaurant_names(user_query)
+    return (names[0] if names else ""), confidence
+
+
+# ==================== TASK 2: KEYWORD SCORER ====================
+
+KEYWORD_SCORES = {
+    "awful": 1, "horrible": 1, "disgusting": 1,
+    "bad": 2, "unpleasant": 2, "offensive": 2,
+    "average": 3, "uninspiring": 3, "forgettable": 3,
+    "good": 4, "enjoyable": 4, "satisfying": 4,
+    "awesome": 5, "incredible": 5, "amazing": 5,
+}
+
+# One alternation over all keywords: a single left-to-right scan yields every
+# keyword in order of appearance (whole words only, so "goods" or
+# "unsatisfying" do not count).
+KEYWORD_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(KEYWORD_SCORES, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+# Set REVIEW_LLM_AUDIT=1 to send every review to the LLM and report how often
+# it agrees with the keyword scorer.
+LLM_AUDIT = os.environ.get("REVIEW_LLM_AUDIT") == "1"
+
+
+def keyword_scores_in_order(review: str) -> List[int]:
+    """Return the score of every keyword in the review, in order of appearance."""
+    return [KEYWORD_SCORES[m.group(1).lower()] for m in KEYWORD_PATTERN.finditer(review)]
+
+
+def score_review(review: str) -> Optional[Tuple[int, int]]:
+    """
+    Deterministically score a review as (food, service).
+    The first keyword is the food score and the second the service score.
+    Returns None when the review has fewer than two keywords (ambiguous).
+    """
+    scores = keyword_scores_in_order(review)
+    if len(scores) < 2:
+        return None
+    return scores[0], scores[1]
+
+
+def fallback_score_review(review: str) -> Tuple[int, int]:
+    """Best-effort score for a review the scorer and the LLM could not settle."""
+    scores = keyword_scores_in_order(review)
+    if len(scores) >= 2:
+        return scores[0], scores[1]
+    if len(scores) == 1:
+        return scores[0], scores[0]
+    return 3, 3
+
+
+def parse_review_analysis(analysis_text: str) -> List[Tuple[int, int]]:
+    """Parse lines like "1: food=4, service=5" from the review analysis agent."""
+    scores = []
+    for line in analysis_text.split('\n'):
+        food_match = re.search(r'food[=:\s]+(\d)', line, re.IGNORECASE)
+        service_match = re.search(r'service[=:\s]+(\d)', line, re.IGNORECASE)
+        if food_match and service_match:
+            scores.append((int(food_match.group(1)), int(service_match.group(1))))
+    return scores
+
+
+def agreement_report(keyword_scores: List[Optional[Tuple[int, int]]],
+                     llm_scores: List[Optional[Tuple[int, int]]]) -> Dict[str, float]:
+    """
+    Compare keyword and LLM scores on the reviews both of them scored.
+    Returns the number of compared reviews and the food, service and
+    full-pair agreement rates.
+    """
+    pairs = [(k, l) for k, l in zip(keyword_scores, llm_scores) if k is not None and l is not None]
+    if not pairs:
+        return {"compared": 0, "food": 0.0, "service": 0.0, "both": 0.0}
+    n = len(pairs)
+    return {
+        "compared": n,
+        "food": sum(k[0] == l[0] for k, l in pairs) / n,
+        "service": sum(k[1] == l[1] for k, l in pairs) / n,
+        "both": sum(k == l for k, l in pairs) / n,
+    }
+
+
 # ==================== TASK 3: CALCULATE OVERALL SCORE ====================
 
 def calculate_overall_score(restaurant_name: str, food_scores: List[int], customer_service_scores: List[int]) -> Dict[str, float]:
@@ -102,6 +305,448 @@ def calculate_overall_score(restaurant_name: str, food_scores: List[int], custom
     return {restaurant_name: round(overall_score, 3)}
 
 
+# ==================== BATCH SCORING ====================
+
+def calculate_overall_scores_batch(restaurant_names: List[str], food_scores: np.ndarray,
+                                   customer_service_scores: np.ndarray,
+                                   restaurant_index: np.ndarray) -> Dict[str, float]:
+    """
+    Vectorized calculate_overall_score for many restaurants at once.
+    food_scores, customer_service_scores and restaurant_index are flat arrays
+    with one entry per review; restaurant_index[i] is the position of the
+    review's restaurant in restaurant_names.
+    """
+    n = len(restaurant_names)
+    # sqrt(food^2 * service) == food * sqrt(service)
+    terms = food_scores * np.sqrt(customer_service_scores)
+    totals = np.bincount(restaurant_index, weights=terms, minlength=n)
+    counts = np.bincount(restaurant_index, minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(counts > 0, totals / (counts * math.sqrt(125)) * 10, 0.0)
+    return {name: round(float(score), 3) for name, score in zip(restaurant_names, scores)}
+
+
+def build_score_table(data_file: str = DATA_FILE) -> Dict[str, float]:
+    """
+    Score every restaurant in the data file with the keyword scorer (no LLM
+    calls; ambiguous reviews get fallback_score_review).
+    """
+    data = load_restaurant_data(data_file)
+    names = list(data.keys())
+    food, service, index = [], [], []
+    for i, name in enumerate(names):
+        for review in data[name]:
+            f, s = fallback_score_review(review)
+            food.append(f)
+            service.append(s)
+            index.append(i)
+    return calculate_overall_scores_batch(
+        names,
+        np.array(food, dtype=np.float64),
+        np.array(service, dtype=np.float64),
+        np.array(index, dtype=np.int64),
+    )
+
+
+_score_table_cache: Dict[str, object] = {"fingerprint": None, "scores": None}
+
+
+def get_score_table(data_file: str = DATA_FILE, cache_file: Optional[str] = SCORE_CACHE_FILE) -> Dict[str, float]:
+    """
+    Return the overall score of every restaurant, computing it at most once
+    per version of the data file. The table is kept in memory and, when
+    cache_file is set, on disk; both are invalidated when the data file's
+    fingerprint changes.
+    """
+    fingerprint = [os.path.abspath(data_file)] + data_fingerprint(data_file)
+    if _score_table_cache["fingerprint"] == fingerprint:
+        return _score_table_cache["scores"]
+
+    scores = None
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                scores = cached["scores"]
+        except (OSError, ValueError, KeyError):
+            scores = None
+
+    if scores is None:
+        scores = build_score_table(data_file)
+        if cache_file:
+            try:
+                with open(cache_file, "w", encoding="utf-8") as f:
+                    json.dump({"fingerprint": fingerprint, "scores": scores}, f)
+            except OSError:
+                pass
+
+    _score_table_cache["fingerprint"] = fingerprint
+    _score_table_cache["scores"] = scores
+    return scores
+
+
+def score_many(queries: List[str]) -> List[Dict[str, float]]:
+    """
+    Answer many user queries in one call from the precomputed score table.
+    Returns one {restaurant_name: score} dict per query ({} if no restaurant
+    matched). There is no LLM to settle a query the local matcher is not
+    confident about, so an ambiguous one ("Subway vs Chipotle") gets every
+    equally good candidate rather than an arbitrary pick.
+    """
+    table = get_score_table()
+    return [{name: table[name] for name in match_restaurant_names(query)[0]} for query in queries]
+
+
+# ==================== AGENTS ====================
+
+ENTRYPOINT_SYSTEM_MESSAGE = (
+    "You are the entrypoint agent. Extract the restaurant name from the user's query. "
+    "Respond with ONLY the restaurant name, nothing else."
+)
+
+REVIEW_ANALYSIS_SYSTEM_MESSAGE = (
+    "You are a review analysis agent. Analyze restaurant reviews to extract food and service scores.\n\n"
+    "SCORING KEYWORDS (use ONLY these):\n"
+    "Score 1: awful, horrible, disgusting\n"
+    "Score 2: bad, unpleasant, offensive\n"
+    "Score 3: average, uninspiring, forgettable\n"
+    "Score 4: good, enjoyable, satisfying\n"
+    "Score 5: awesome, incredible, amazing\n\n"
+    "RULES:\n"
+    "- Each review has EXACTLY TWO keywords from the list above\n"
+    "- The FIRST keyword found relates to FOOD quality\n"
+    "- The SECOND keyword found relates to CUSTOMER SERVICE quality\n"
+    "- Find these keywords in order of appearance in the text\n\n"
+    "Output format (one line per review, numbered):\n"
+    "1: food=X, service=Y\n"
+    "2: food=X, service=Y\n"
+    "etc.\n\n"
+    "Output ONLY the numbered list, nothing else."
+)
+
+
+# Review analysis requests are split into batches of at most this many
+# (estimated) tokens / reviews, analysed concurrently and merged in order
+REVIEW_BATCH_TOKENS = 1500
+REVIEW_BATCH_MAX_REVIEWS = 25
+REVIEW_BATCH_WORKERS = 4
+# Extra attempts for a batch whose reply does not parse
+REVIEW_BATCH_RETRIES = 1
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def split_review_batches(reviews: List[str], indices: List[int],
+                         max_tokens: int = REVIEW_BATCH_TOKENS,
+                         max_reviews: int = REVIEW_BATCH_MAX_REVIEWS) -> List[List[int]]:
+    """
+    Group review indices into consecutive batches that stay within
+    max_tokens and max_reviews. A single review over the budget gets a
+    batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i in indices:
+        tokens = estimate_tokens(reviews[i]) + 4  # "Review N: " prefix and newline
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_reviews):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class RestaurantAgents:
+    """
+    One set of the pipeline's AutoGen agents, built once and reused across
+    queries. Agents keep per-chat state, so a set must only serve one query
+    at a time (RestaurantScoringService hands them out from a pool). Each
+    set holds batch_workers review analysis agents so the batches of one
+    query can be analysed concurrently.
+    """
+
+    def __init__(self, silent: bool = True, batch_workers: int = REVIEW_BATCH_WORKERS):
+        self.silent = silent
+        # Create a simple user proxy for receiving responses
+        self.user_proxy = ConversableAgent(
+            name="user_proxy",
+            llm_config=False,
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=0,
+        )
+        self.entrypoint_agent = ConversableAgent(
+            name="entrypoint_agent",
+            system_message=ENTRYPOINT_SYSTEM_MESSAGE,
+            llm_config=llm_config,
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=1,
+        )
+        # One (user proxy, review analysis agent) pair per concurrent batch
+        self._review_pairs: "queue.Queue[Tuple[ConversableAgent, ConversableAgent]]" = queue.Queue()
+        for _ in range(batch_workers):
+            proxy = ConversableAgent(
+                name="user_proxy",
+                llm_config=False,
+                human_input_mode="NEVER",
+                max_consecutive_auto_reply=0,
+            )
+            review_analysis_agent = ConversableAgent(
+                name="review_analysis_agent",
+                system_message=REVIEW_ANALYSIS_SYSTEM_MESSAGE,
+                llm_config=llm_config,
+                human_input_mode="NEVER",
+                max_consecutive_auto_reply=1,
+            )
+            self._review_pairs.put((proxy, review_analysis_agent))
+        self._batch_executor = ThreadPoolExecutor(max_workers=batch_workers)
+
+    def extract_restaurant_name(self, user_query: str) -> str:
+        """Ask the entrypoint agent for the restaurant name in the query."""
+        result = self.user_proxy.initiate_chat(
+            self.entrypoint_agent,
+            message=f"Extract the restaurant name from this query: {user_query}",
+            max_turns=1,
+            clear_history=True,
+            silent=self.silent,
+        )
+        return result.summary.strip()
+
+    def analyze_reviews(self, restaurant_name: str, reviews: List[str]) -> List[Tuple[int, int]]:
+        """Ask a review analysis agent for (food, service) scores of each review."""
+        reviews_text = f"Restaurant: {restaurant_name}\n\n"
+        for n, review in enumerate(reviews, 1):
+            reviews_text += f"Review {n}: {review}\n"
+
+        proxy, review_analysis_agent = self._review_pairs.get()
+        try:
+            analysis_result = proxy.initiate_chat(
+                review_analysis_agent,
+                message=f"Analyze these reviews and extract scores:\n\n{reviews_text}",
+                max_turns=1,
+                clear_history=True,
+                silent=self.silent,
+            )
+        finally:
+            self._review_pairs.put((proxy, review_analysis_agent))
+        return parse_review_analysis(analysis_result.summary)
+
+    def _analyze_batch(self, restaurant_name: str, reviews: List[str]) -> Tuple[Optional[List[Tuple[int, int]]], int]:
+        """Analyse one batch, retrying it alone if the reply does not parse. Returns (scores or None, LLM calls)."""
+        calls = 0
+        for _ in range(1 + REVIEW_BATCH_RETRIES):
+            calls += 1
+            try:
+                parsed = self.analyze_reviews(restaurant_name, reviews)
+            except Exception as e:
+                print(f"[review analysis] batch failed: {e}", file=sys.stderr)
+                continue
+            # Only trust the reply if it covers every review we sent
+            if len(parsed) == len(reviews):
+                return parsed, calls
+        return None, calls
+
+    def analyze_review_batches(self, restaurant_name: str, reviews: List[str],
+                               batches: List[List[int]]) -> Tuple[Dict[int, Tuple[int, int]], int]:
+        """
+        Analyse batches of review indices concurrently. Returns the scores of
+        every review whose batch parsed, keyed by review index, and the
+        number of LLM calls made. Reviews of failed batches are left out.
+        """
+        if len(batches) == 1:
+            outcomes = [self._analyze_batch(restaurant_name, [reviews[i] for i in batches[0]])]
+        else:
+            outcomes = list(self._batch_executor.map(
+                lambda batch: self._analyze_batch(restaurant_name, [reviews[i] for i in batch]),
+                batches,
+            ))
+
+        scores: Dict[int, Tuple[int, int]] = {}
+        calls = 0
+        for batch, (parsed, batch_calls) in zip(batches, outcomes):
+            calls += batch_calls
+            if parsed is not None:
+                scores.update(zip(batch, parsed))
+        return scores, calls
+
+    def close(self):
+        """Shut down the batch worker threads."""
+        self._batch_executor.shutdown(wait=True)
+
+
+# ==================== QUERY PIPELINE ====================
+
+def analyze_query(user_query: str, agents: RestaurantAgents) -> Dict[str, object]:
+    """
+    Run the full pipeline for one query and return a structured result:
+    query, restaurant (canonical name, or None if not found), score,
+    reviews (per-review food/service scores and their source: "keyword",
+    "llm" or "fallback"), llm_calls, agreement (audit mode only) and
+    timings (seconds per step).
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    llm_calls = 0
+
+    # ==================== STEP 1: DATA FETCH (Agent-coordinated) ====================
+    # The local matcher resolves most queries; the entrypoint agent only
+    # extracts the restaurant name when the matcher is not confident.
+
+    restaurant_name, confidence = extract_restaurant_name(user_query)
+    if confidence < NAME_CONFIDENCE_THRESHOLD:
+        restaurant_name = agents.extract_restaurant_name(user_query)
+        llm_calls += 1
+    timings["name"] = time.perf_counter() - start
+
+    step = time.perf_counter()
+    fetched_data = fetch_restaurant_data(restaurant_name)
+    timings["fetch"] = time.perf_counter() - step
+
+    result: Dict[str, object] = {
+        "query": user_query,
+        "restaurant": None,
+        "extracted_name": restaurant_name,
+        "score": None,
+        "reviews": [],
+        "llm_calls": llm_calls,
+        "agreement": None,
+        "timings": timings,
+    }
+    if not fetched_data:
+        timings["total"] = time.perf_counter() - start
+        return result
+
+    canonical_name, reviews = next(iter(fetched_data.items()))
+
+    # ==================== STEP 2: REVIEW ANALYSIS ====================
+    # The keyword scorer settles most reviews; only ambiguous ones (or all of
+    # them, in audit mode) go to the review analysis agent, in token-bounded
+    # batches. Reviews of a batch that still fails after its retry fall back
+    # to fallback_score_review.
+
+    step = time.perf_counter()
+    keyword_scores = [score_review(review) for review in reviews]
+    if LLM_AUDIT:
+        pending = list(range(len(reviews)))
+    else:
+        pending = [i for i, scores in enumerate(keyword_scores) if scores is None]
+
+    llm_scores: List[Optional[Tuple[int, int]]] = [None] * len(reviews)
+    if pending:
+        batches = split_review_batches(reviews, pending)
+        batch_scores, calls = agents.analyze_review_batches(canonical_name, reviews, batches)
+        llm_calls += calls
+        for i, scores in batch_scores.items():
+            llm_scores[i] = scores
+
+    if LLM_AUDIT:
+        result["agreement"] = agreement_report(keyword_scores, llm_scores)
+
+    review_results = []
+    for review, kw, llm in zip(reviews, keyword_scores, llm_scores):
+        if kw:
+            (food, service), source = kw, "keyword"
+        elif llm:
+            (food, service), source = llm, "llm"
+        else:
+            (food, service), source = fallback_score_review(review), "fallback"
+        review_results.append({"food": food, "service": service, "source": source})
+    timings["analysis"] = time.perf_counter() - step
+
+    # ==================== STEP 3: CALCULATE OVERALL SCORE ====================
+
+    step = time.perf_counter()
+    score = calculate_overall_score(
+        canonical_name,
+        [r["food"] for r in review_results],
+        [r["service"] for r in review_results],
+    )[canonical_name]
+    timings["score"] = time.perf_counter() - step
+    timings["total"] = time.perf_counter() - start
+
+    result.update(restaurant=canonical_name, score=score, reviews=review_results, llm_calls=llm_calls)
+    return result
+
+
+# ==================== QUERY SERVICE ====================
+
+class RestaurantScoringService:
+    """
+    Long-lived query service: builds max_workers agent sets once and answers
+    queries concurrently, at most max_workers at a time. Agent chats are not
+    printed unless silent=False.
+
+        with RestaurantScoringService(max_workers=4) as service:
+            results = service.answer_many(queries)
+    """
+
+    def __init__(self, max_workers: int = 4, silent: bool = True):
+        self.max_workers = max_workers
+        self._agents: "queue.Queue[RestaurantAgents]" = queue.Queue()
+        for _ in range(max_workers):
+            self._agents.put(RestaurantAgents(silent=silent))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def answer(self, user_query: str) -> Dict[str, object]:
+        """Answer one query on the calling thread with a pooled agent set."""
+        agents = self._agents.get()
+        try:
+            return analyze_query(user_query, agents)
+        finally:
+            self._agents.put(agents)
+
+    def answer_many(self, queries: List[str]) -> List[Dict[str, object]]:
+        """Answer a batch of queries concurrently; results are in query order."""
+        return list(self._executor.map(self.answer, queries))
+
+    def stream(self, queries: Iterable[str]) -> Iterator[Dict[str, object]]:
+        """
+        Answer a (possibly unbounded) stream of queries, yielding results as
+        they complete. At most 2 * max_workers queries are in flight, so the
+        input is consumed only as fast as it is answered.
+        """
+        in_flight = set()
+        for query in queries:
+            in_flight.add(self._executor.submit(self.answer, query))
+            if len(in_flight) >= 2 * self.max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(in_flight):
+            yield future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        # Every query has finished, so all agent sets are back in the pool
+        while True:
+            try:
+                self._agents.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_service: Dict[str, Optional[RestaurantScoringService]] = {"service": None}
+
+
+def get_default_service() -> RestaurantScoringService:
+    """Process-wide single-worker service used by main() (prints agent chats)."""
+    if _default_service["service"] is None:
+        _default_service["service"] = RestaurantScoringService(max_workers=1, silent=False)
+    return _default_service["service"]
+
+
 # ==================== MAIN FUNCTION WITH AUTOGEN ====================
 
 def main(user_query: str):
@@ -113,151 +758,36 @@ def main(user_query: str):
     2. Data Fetch Step - Extract restaurant and fetch reviews
     3. Review Analysis Agent - Extract food/service scores using LLM
     4. Scoring Step - Calculate final overall score
-    """
     
-    # ==================== STEP 1: DATA FETCH (Agent-coordinated) ====================
-    # Entrypoint agent extracts restaurant name
-    
-    entrypoint_agent = ConversableAgent(
-        name="entrypoint_agent",
-        system_message=(
-            "You are the entrypoint agent. Extract the restaurant name from the user's query. "
-            "Respond with ONLY the restaurant name, nothing else."
-        ),
-        llm_config=llm_config,
-        human_input_mode="NEVER",
-        max_consecutive_auto_reply=1,
-    )
-    
-    # Create a simple user proxy for receiving responses
-    user_proxy = ConversableAgent(
-        name="user_proxy",
-        llm_config=False,
-        human_input_mode="NEVER",
-        max_consecutive_auto_reply=0,
-    )
-    
-    # Get restaurant name from entrypoint agent
-    result = user_proxy.initiate_chat(
-        entrypoint_agent,
-        message=f"Extract the restaurant name from this query: {user_query}",
-        max_turns=1,
-    )
-    
-    restaurant_name = result.summary.strip()
-    
-    # Fetch the actual data
-    fetched_data = fetch_restaurant_data(restaurant_name)
+    The agents are built once per process and reused across calls.
+    """
+    result = get_default_service().answer(user_query)
     
-    if not fetched_data:
-        print(f"Could not find restaurant: {restaurant_name}")
+    if result["restaurant"] is None:
+        print(f"Could not find restaurant: {result['extracted_name']}")
         return
     
-    canonical_name, reviews = next(iter(fetched_data.items()))
-    
-    # ==================== STEP 2: REVIEW ANALYSIS AGENT ====================
-    
-    review_analysis_agent = ConversableAgent(
-        name="review_analysis_agent",
-        system_message=(
-            "You are a review analysis agent. Analyze restaurant reviews to extract food and service scores.\n\n"
-            "SCORING KEYWORDS (use ONLY these):\n"
-            "Score 1: awful, horrible, disgusting\n"
-            "Score 2: bad, unpleasant, offensive\n"
-            "Score 3: average, uninspiring, forgettable\n"
-            "Score 4: good, enjoyable, satisfying\n"
-            "Score 5: awesome, incredible, amazing\n\n"
-            "RULES:\n"
-            "- Each review has EXACTLY TWO keywords from the list above\n"
-            "- The FIRST keyword found relates to FOOD quality\n"
-            "- The SECOND keyword found relates to CUSTOMER SERVICE quality\n"
-            "- Find these keywords in order of appearance in the text\n\n"
-            "Output format (one line per review, numbered):\n"
-            "1: food=X, service=Y\n"
-            "2: food=X, service=Y\n"
-            "etc.\n\n"
-            "Output ONLY the numbered list, nothing else."
-        ),
-        llm_config=llm_config,
-        human_input_mode="NEVER",
-        max_consecutive_auto_reply=1,
-    )
-    
-    # Prepare reviews message
-    reviews_text = f"Restaurant: {canonical_name}\n\n"
-    for i, review in enumerate(reviews, 1):
-        reviews_text += f"Review {i}: {review}\n"
+    if result["agreement"] is not None:
+        report = result["agreement"]
+        print(
+            f"[audit] keyword vs LLM on {report['compared']} reviews: "
+            f"food {report['food']:.1%}, service {report['service']:.1%}, both {report['both']:.1%}",
+            file=sys.stderr,
+        )
     
-    # Get analysis from agent
-    analysis_result = user_proxy.initiate_chat(
-        review_analysis_agent,
-        message=f"Analyze these reviews and extract scores:\n\n{reviews_text}",
-        max_turns=1,
-    )
-    
-    # Parse the analysis to extract scores
-    analysis_text = analysis_result.summary
-    
-    food_scores = []
-    service_scores = []
-    
-    # Parse the agent's response to extract scores
-    for line in analysis_text.split('\n'):
-        # Look for patterns like "1: food=4, service=5" or "food=4, service=5"
-        food_match = re.search(r'food[=:\s]+(\d)', line, re.IGNORECASE)
-        service_match = re.search(r'service[=:\s]+(\d)', line, re.IGNORECASE)
-        
-        if food_match and service_match:
-            food_scores.append(int(food_match.group(1)))
-            service_scores.append(int(service_match.group(1)))
-    
-    # Fallback: if agent parsing failed, use deterministic keyword matching
-    if len(food_scores) != len(reviews):
-        keyword_map = {
-            "awful": 1, "horrible": 1, "disgusting": 1,
-            "bad": 2, "unpleasant": 2, "offensive": 2,
-            "average": 3, "uninspiring": 3, "forgettable": 3,
-            "good": 4, "enjoyable": 4, "satisfying": 4,
-            "awesome": 5, "incredible": 5, "amazing": 5,
-        }
-        
-        food_scores = []
-        service_scores = []
-        
-        for review in reviews:
-            review_lower = review.lower()
-            found = []
-            
-            # Find keywords in order of appearance
-            for keyword in keyword_map.keys():
-                pos = review_lower.find(keyword)
-                if pos != -1:
-                    found.append((pos, keyword))
-            
-            found.sort()  # Sort by position
-            
-            if len(found) >= 2:
-                food_scores.append(keyword_map[found[0][1]])
-                service_scores.append(keyword_map[found[1][1]])
-            elif len(found) == 1:
-                food_scores.append(keyword_map[found[0][1]])
-                service_scores.append(keyword_map[found[0][1]])
-            else:
-                food_scores.append(3)
-                service_scores.append(3)
-    
-    # ==================== STEP 3: CALCULATE OVERALL SCORE ====================
-    
-    result = calculate_overall_score(canonical_name, food_scores, service_scores)
-    score = result[canonical_name]
-    
-    print(f"{canonical_name}: {score:.3f}")
+    print(f"{result['restaurant']}: {result['score']:.3f}")
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python main.py '<restaurant query>'")
+        print("       python main.py --leaderboard")
         sys.exit(1)
     
+    if sys.argv[1] == "--leaderboard":
+        for name, score in sorted(get_score_table().items(), key=lambda item: -item[1]):
+            print(f"{name}: {score:.3f}")
+        sys.exit(0)
+    
     user_query = " ".join(sys.argv[1:])
     main(user_query)
@@ -0,0 +1,127 @@
+"""
+Local mock of an OpenAI-compatible chat completions endpoint for offline runs.
+
+    python mock_llm.py --port 8000
+    LLM_BASE_URL=http://127.0.0.1:8000/v1 GROQ_API_KEY=mock python test.py
+
+The entrypoint agent gets the query back verbatim (fetch_restaurant_data's
+substring match finds the restaurant in it) and the review analysis agent
+gets keyword-based scores in the "N: food=X, service=Y" format.
+
+The server itself is generic: start_mock_server(reply=...) serves any
+function from the request's messages to the reply text, streamed as
+server-sent events when the request asks for "stream".
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+
+def mock_reply(messages: List[dict]) -> str:
+    """Answer the last user message the way the real agents are prompted to."""
+    from main import fallback_score_review
+
+    message = messages[-1]["content"] if messages else ""
+    if "Extract the restaurant name" in message:
+        return message.split("query:", 1)[-1].strip()
+    lines = []
+    for n, review in re.findall(r"^Review (\d+): (.*)$", message, re.MULTILINE):
+        food, service = fallback_score_review(review)
+        lines.append(f"{n}: food={food}, service={service}")
+    return "\n".join(lines)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0  # seconds added to every reply, to simulate network time
+    reply: Callable[[List[dict]], str] = staticmethod(mock_reply)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        content = self.reply(body["messages"])
+        if self.latency:
+            time.sleep(self.latency)
+        if body.get("stream"):
+            self._stream(body, content)
+            return
+        data = json.dumps({
+            "id": "mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, body: dict, content: str):
+        """Send the reply as server-sent events, a few characters per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [content[i:i + 3] for i in range(0, len(content), 3)] + [None]
+        for piece in pieces:
+            chunk = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_mock_server(port: int = 8000, latency: float = 0.0,
+                      reply: Optional[Callable[[List[dict]], str]] = None,
+                      background: bool = True) -> ThreadingHTTPServer:
+    """
+    Start the mock and return the server. With background (the default) it
+    runs in a daemon thread (call .shutdown() to stop); otherwise this call
+    serves until interrupted.
+    """
+    attributes = {"latency": latency}
+    if reply is not None:
+        attributes["reply"] = staticmethod(reply)
+    server = ThreadingHTTPServer(("127.0.0.1", port), type("Handler", (MockLLMHandler,), attributes))
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Mock LLM listening on http://127.0.0.1:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM endpoint")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every reply")
+    args = parser.parse_args()
+    start_mock_server(args.port, args.latency, background=False)
@@ -0,0 +1,131 @@
+"""
+Synthetic review datasets in the restaurant-data.txt format, for load and
+scaling tests of the scoring pipeline.
+
+    python synthetic_data.py --restaurants 100000 --reviews 2000000 --output synthetic-data.txt
+
+Every line is "<Restaurant>. <review>", like the real file. Reviews use the
+lab's keyword vocabulary (KEYWORD_SCORES): the first keyword rates the food
+and the second the service, and a configurable share of reviews is
+ambiguous (fewer than two keywords) so the LLM path is exercised too.
+Review counts per restaurant follow a Zipf-like distribution (a few very
+popular restaurants, a long tail with one or two reviews). The same seed
+always produces the same file.
+"""
+import argparse
+import itertools
+import time
+from typing import List
+
+import numpy as np
+
+from main import KEYWORD_SCORES
+
+# Name parts avoid the scoring keywords so reviews that mention the name
+# still contain exactly the keywords they were generated with
+_OWNERS = ["Rosa's", "Tony's", "Mama Lin's", "Big Al's", "Sal's", "Nonna's", "Kenji's", "Abuela's",
+           "Pete's", "Lucy's", "Omar's", "Priya's", "Hank's", "Dot's", "Marco's", "Mei's"]
+_ADJECTIVES = ["Golden", "Blue", "Lucky", "Red", "Silver", "Green", "Rustic", "Little", "Urban", "Happy",
+               "Smoky", "Crispy", "Sunny", "Royal", "Hungry", "Spicy", "Cozy", "Wild", "Old Town", "Harbor",
+               "Copper", "Velvet", "Maple", "Cedar", "Salty", "Sweet", "Midnight", "Eastside", "Westside", "Northern"]
+_NOUNS = ["Dragon", "Spoon", "Fork", "Lantern", "Oven", "Skillet", "Garden", "Anchor", "Barrel", "Pepper",
+          "Olive", "Lotus", "Tiger", "Falcon", "Bamboo", "Kettle", "Ladle", "Basil", "Saffron", "Noodle",
+          "Taco", "Burger", "Dumpling", "Waffle", "Bagel", "Curry", "Pho", "Ramen", "Pizza", "Biscuit"]
+_KINDS = ["Cafe", "Bistro", "Kitchen", "Diner", "Grill", "Tavern", "Eatery", "House", "Bar & Grill",
+          "Cantina", "Trattoria", "Noodle Bar", "Steakhouse", "Bakery", "Deli", "Smokehouse", "Taqueria", "Pub"]
+
+_TEMPLATES = [
+    "The food at {name} was {food}, and the customer service was {service}.",
+    "{name} serves {food} dishes. The staff were {service} throughout our visit.",
+    "Our meal was {food}. Service at {name} felt {service}.",
+    "I found the menu at {name} {food}; the waiters were {service} and quick to help.",
+    "The {food} flavors at {name} stood out, while the service was {service}.",
+    "Honestly the food was {food}. The customer service team at {name} was {service}.",
+    "{name} had {food} food and {service} service on a busy Friday night.",
+    "Food: {food}. Service: {service}. That sums up our dinner at {name}.",
+]
+# Fewer than two keywords: the keyword scorer cannot settle these
+_AMBIGUOUS_TEMPLATES = [
+    "The food at {name} was fine and the staff were polite enough.",
+    "We stopped by {name} for lunch; the food was {food} but I can't say much about the service.",
+    "{name} is a place we keep coming back to, for reasons that are hard to put into words.",
+]
+
+
+def restaurant_names(n: int, seed: int = 0) -> List[str]:
+    """n distinct restaurant names ("<Adjective> <Noun> <Kind>", some with an owner prefix)."""
+    rng = np.random.default_rng(seed)
+    base = [f"{a} {b} {c}" for a, b, c in itertools.product(_ADJECTIVES, _NOUNS, _KINDS)]
+    owned = [f"{o} {b} {c}" for o, b, c in itertools.product(_OWNERS, _NOUNS, _KINDS)]
+    pool = base + owned
+    order = rng.permutation(len(pool))
+    names = [pool[i] for i in order[:n]]
+    # Past the vocabulary size, number the branches
+    for i in range(len(names), n):
+        names.append(f"{pool[order[i % len(pool)]]} {i // len(pool) + 1}")
+    return names
+
+
+def generate(path: str, restaurants: int = 100_000, reviews: int = 2_000_000,
+             ambiguous: float = 0.05, skew: float = 0.8, seed: int = 0) -> dict:
+    """
+    Write a synthetic data file.
+
+    Args:
+        path: Output file
+        restaurants: Number of distinct restaurants
+        reviews: Total reviews (at least one per restaurant)
+        ambiguous: Share of reviews with fewer than two keywords
+        skew: Zipf exponent of reviews per restaurant (0 = uniform)
+        seed: Random seed
+
+    Returns:
+        dict: restaurants, reviews, ambiguous, bytes and seconds
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    names = restaurant_names(restaurants, seed)
+    reviews = max(reviews, restaurants)
+
+    weights = 1.0 / np.arange(1, restaurants + 1) ** skew
+    counts = 1 + rng.multinomial(reviews - restaurants, weights / weights.sum())
+    owners = rng.permutation(np.repeat(np.arange(restaurants), counts))
+
+    keywords = list(KEYWORD_SCORES)
+    food_kw = rng.integers(0, len(keywords), reviews)
+    service_kw = rng.integers(0, len(keywords), reviews)
+    template = rng.integers(0, len(_TEMPLATES), reviews)
+    is_ambiguous = rng.random(reviews) < ambiguous
+    ambiguous_template = rng.integers(0, len(_AMBIGUOUS_TEMPLATES), reviews)
+
+    size = 0
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        for i in range(reviews):
+            name = names[owners[i]]
+            pattern = _AMBIGUOUS_TEMPLATES[ambiguous_template[i]] if is_ambiguous[i] else _TEMPLATES[template[i]]
+            line = f"{name}. " + pattern.format(name=name, food=keywords[food_kw[i]],
+                                                service=keywords[service_kw[i]]) + "\n"
+            size += len(line)
+            f.write(line)
+    return {
+        "restaurants": restaurants,
+        "reviews": reviews,
+        "ambiguous": int(is_ambiguous.sum()),
+        "bytes": size,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic restaurant review dataset")
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--reviews", type=int, default=2_000_000)
+    parser.add_argument("--ambiguous", type=float, default=0.05, help="share of reviews with < 2 keywords")
+    parser.add_argument("--skew", type=float, default=0.8, help="Zipf exponent of reviews per restaurant")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic-data.txt")
+    args = parser.parse_args()
+    stats = generate(args.output, args.restaurants, args.reviews, args.ambiguous, args.skew, args.seed)
+    print(f"Wrote {stats['reviews']:,} reviews of {stats['restaurants']:,} restaurants "
+          f"({stats['ambiguous']:,} ambiguous, {stats['bytes'] / 2**20:.1f} MB) to {args.output} "
+          f"in {stats['seconds']}s")
@@ -0,0 +1,239 @@
+"""
+Attack x defense evaluation matrix for Lab 02 / Lab 03.
+
+Runs every Lab 02 attack (`attack-*.txt`) against every defense in this
+folder (`defense*.txt`) on an OpenAI-compatible endpoint. Each defense gets
+a random secret key in its system message, built the way the autograder
+does it. Multi-turn attacks are replayed turn by turn (see
+conversation.py) and stop as soon as the replies leak the key.
+
+    python evaluate.py                                   # OpenAI, gpt-4o-mini
+    python mock_llm.py --port 8000 &
+    python evaluate.py --base-url http://127.0.0.1:8000/v1 --api-key mock
+
+Cells run concurrently (--workers) and replies are cached on disk by
+conversation prefix (--cache), so re-running after editing one prompt only
+re-queries the conversations that prompt is part of. --sanitize scores the
+defenses with the streaming output sanitizer (sanitizer.py) in front of them.
+
+Next to the leak rates, the matrix shows each defense's system-message
+tokens per request and warns about defenses that cost twice as much as the
+cheapest one (see prompt_budget.py). --key-last puts the defense before the
+key sentence so providers with prefix caching can reuse it across keys.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from conversation import ConversationRunner, PrefixCache, parse_attack_turns
+from leak_detection import build_system_message, generate_secret
+from prompt_budget import cost_warnings, defense_budget
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ATTACKS = os.path.join(HERE, "..", "..", "Lab 2", "lab02_release", "attack-*.txt")
+DEFAULT_DEFENSES = os.path.join(HERE, "defense*.txt")
+DEFAULT_CACHE = os.path.join(HERE, "eval-cache.json")
+
+
+def load_prompts(pattern: str) -> Dict[str, str]:
+    """Load every non-empty prompt file matching the glob, keyed by file stem."""
+    prompts = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        if text:
+            prompts[os.path.splitext(os.path.basename(path))[0]] = text
+    return prompts
+
+
+class ChatClient:
+    """Chat completions against an OpenAI-compatible endpoint (uncached; see PrefixCache)."""
+
+    def __init__(self, model: str = "gpt-4o-mini", base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, temperature: float = 1.0, top_p: float = 1.0,
+                 max_tokens: int = 512):
+        from openai import OpenAI
+        self.client = OpenAI(base_url=base_url, api_key=api_key or os.environ.get("OPENAI_API_KEY"))
+        self.model = model
+        self.temperature = temperature
+        self.top_p = top_p
+        self.max_tokens = max_tokens
+
+    def params(self, sample: int = 0) -> dict:
+        """Everything besides the messages that determines a reply; keys the cache."""
+        return {
+            "model": self.model,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+            "sample": sample,
+        }
+
+    def stream(self, messages: List[dict]) -> Iterator[str]:
+        """Yield the reply as it streams in (wrap with sanitizer.sanitize_stream to redact the key)."""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def complete(self, messages: List[dict]) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+        )
+        return response.choices[0].message.content or ""
+
+
+def cell_secret(seed: int, defense: str, sample: int) -> str:
+    """
+    Random but reproducible secret for one defense and sample. It is shared
+    by all attacks on that defense, so their conversations start from the
+    same system message and share cached prefixes.
+    """
+    return generate_secret(random.Random(f"{seed}:{defense}:{sample}"))
+
+
+def evaluate_cell(client: ChatClient, cache: PrefixCache, attack_name: str, attack: str,
+                  defense_name: str, defense: str, sample: int = 0, seed: int = 0,
+                  max_turns: int = 20, max_tokens: int = 4000, sanitize: bool = False,
+                  key_last: bool = False) -> dict:
+    """Replay one (possibly multi-turn) attack against one defense and report whether the key leaked."""
+    secret = cell_secret(seed, defense_name, sample)
+    turns, repeat_last = parse_attack_turns(attack)
+    runner = ConversationRunner(client.complete, cache, client.params(sample),
+                                max_turns=max_turns, max_tokens=max_tokens)
+    try:
+        outcome = runner.run(build_system_message(secret, defense, key_last), turns, secret,
+                             repeat_last=repeat_last, sanitize=sanitize)
+        error = None
+    except Exception as e:
+        outcome = {"messages": [], "leak": None, "turns": 0, "tokens": 0, "stopped": "error"}
+        error = str(e)
+    return {
+        "attack": attack_name,
+        "defense": defense_name,
+        "sample": sample,
+        "secret": secret,
+        "leak": outcome["leak"],
+        "turns": outcome["turns"],
+        "tokens": outcome["tokens"],
+        "stopped": outcome["stopped"],
+        "transcript": outcome["messages"][1:],
+        "error": error,
+    }
+
+
+def run_matrix(client: ChatClient, cache: PrefixCache, attacks: Dict[str, str],
+               defenses: Dict[str, str], samples: int = 1, workers: int = 8, seed: int = 0,
+               max_turns: int = 20, max_tokens: int = 4000, sanitize: bool = False,
+               key_last: bool = False) -> List[dict]:
+    """Evaluate every (attack, defense, sample) cell concurrently."""
+    jobs = [
+        (attack_name, attack, defense_name, defense, sample)
+        for attack_name, attack in attacks.items()
+        for defense_name, defense in defenses.items()
+        for sample in range(samples)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda job: evaluate_cell(client, cache, *job, seed=seed, max_turns=max_turns,
+                                      max_tokens=max_tokens, sanitize=sanitize, key_last=key_last),
+            jobs,
+        ))
+
+
+def summarize(results: List[dict], budgets: Optional[Dict[str, dict]] = None) -> dict:
+    """
+    Leak rate per (attack, defense) cell, plus the share of defenses each
+    attack breaks and the share of attacks each defense blocks. With budgets
+    (prompt_budget.defense_budget per defense), also the tokens each defense
+    adds to every request and warnings for the expensive ones.
+    """
+    cells: Dict[str, Dict[str, List[bool]]] = {}
+    for r in results:
+        cells.setdefault(r["attack"], {}).setdefault(r["defense"], []).append(r["leak"] is not None)
+    matrix = {
+        attack: {defense: sum(leaks) / len(leaks) for defense, leaks in row.items()}
+        for attack, row in cells.items()
+    }
+    defenses = sorted({d for row in matrix.values() for d in row})
+    return {
+        "matrix": matrix,
+        "attack_success": {a: sum(row.values()) / len(row) for a, row in matrix.items()},
+        "defense_block": {
+            d: 1 - sum(matrix[a][d] for a in matrix) / len(matrix) for d in defenses
+        },
+        "errors": sum(1 for r in results if r["error"]),
+        "defense_tokens": {d: b["system_tokens"] for d, b in (budgets or {}).items() if d in defenses},
+        "cost_warnings": cost_warnings({d: b for d, b in (budgets or {}).items() if d in defenses}),
+    }
+
+
+def print_summary(summary: dict):
+    """Print the leak-rate matrix (rows: attacks, columns: defenses)."""
+    defenses = sorted(summary["defense_block"])
+    width = max([len(a) for a in summary["matrix"]] + [10])
+    print("leak rate".ljust(width) + "".join(d.rjust(14) for d in defenses) + "  attack success")
+    for attack, row in sorted(summary["matrix"].items()):
+        cells = "".join(f"{row[d]:14.2f}" for d in defenses)
+        print(attack.ljust(width) + cells + f"{summary['attack_success'][attack]:16.2f}")
+    print("blocked".ljust(width) + "".join(f"{summary['defense_block'][d]:14.2f}" for d in defenses))
+    tokens = summary.get("defense_tokens")
+    if tokens:
+        print("tokens/request".ljust(width) + "".join(f"{tokens.get(d, 0):14d}" for d in defenses))
+    for warning in summary.get("cost_warnings", []):
+        print(f"warning: {warning} (adds latency and cost to every turn)")
+    if summary["errors"]:
+        print(f"{summary['errors']} request(s) failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate attack prompts against defense prompts")
+    parser.add_argument("--attacks", default=DEFAULT_ATTACKS, help="glob of attack prompt files")
+    parser.add_argument("--defenses", default=DEFAULT_DEFENSES, help="glob of defense prompt files")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL"))
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--samples", type=int, default=1, help="samples per cell")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the per-cell secret keys")
+    parser.add_argument("--max-turns", type=int, default=20, help="turn cap per conversation")
+    parser.add_argument("--max-tokens", type=int, default=4000, help="estimated token cap per conversation")
+    parser.add_argument("--sanitize", action="store_true", help="pass replies through the output sanitizer")
+    parser.add_argument("--key-last", action="store_true", help="put the key sentence after the defense (cacheable prefix)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="reply cache file ('' to disable)")
+    parser.add_argument("--output", default=None, help="write all cell results and the summary as JSON")
+    args = parser.parse_args()
+
+    attacks = load_prompts(args.attacks)
+    defenses = load_prompts(args.defenses)
+    if not attacks or not defenses:
+        raise SystemExit(f"Need at least one attack and one defense (found {len(attacks)} and {len(defenses)})")
+
+    cache = PrefixCache(args.cache or None)
+    client = ChatClient(model=args.model, base_url=args.base_url, api_key=args.api_key)
+    results = run_matrix(client, cache, attacks, defenses, samples=args.samples, workers=args.workers,
+                         seed=args.seed, max_turns=args.max_turns, max_tokens=args.max_tokens,
+                         sanitize=args.sanitize, key_last=args.key_last)
+    cache.save()
+
+    summary = summarize(results, {name: defense_budget(text, args.model) for name, text in defenses.items()})
+    print_summary(summary)
+    print(f"cache: {cache.hits} hit(s), {cache.misses} miss(es)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
@@ -0,0 +1,133 @@
+"""
+Local mock of an OpenAI-compatible chat completions endpoint for offline
+attack/defense runs.
+
+    python mock_llm.py --port 8000
+    python evaluate.py --base-url http://127.0.0.1:8000/v1 --api-key mock
+
+The "model" is a crude, deterministic stand-in with the weaknesses the labs
+talk about: it refuses direct requests for the key when the system message
+says not to reveal it, but answers character-by-character questions, and
+encodes or reverses the key unless the defense mentions encoding or
+rephrasing. It is meant for exercising the harness, not for judging prompts. Replies
+are streamed as server-sent events when the request asks for "stream".
+"""
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_SECRET = re.compile(r"The secret key is \"?([A-Za-z0-9]+)")
+
+
+def mock_reply(messages: list) -> str:
+    """Reply to a conversation the way a naively defended model might."""
+    system = " ".join(m["content"] for m in messages if m["role"] == "system")
+    match = _SECRET.search(system)
+    secret = match.group(1) if match else ""
+    defended = "not reveal" in system.lower() or "never reveal" in system.lower()
+    blocks_encoding = "encoding" in system.lower() or "obfuscation" in system.lower()
+    blocks_rephrasing = "rephrase" in system.lower() or "translate" in system.lower()
+    user = messages[-1]["content"].lower() if messages else ""
+    answered = sum(1 for m in messages if m["role"] == "assistant")
+
+    if "character" in user and secret:
+        return secret[answered] if answered < len(secret) else "That was the last character."
+    if "base64" in user and secret and not blocks_encoding:
+        return base64.b64encode(secret.encode()).decode()
+    if ("reverse" in user or "backwards" in user) and secret and not blocks_rephrasing:
+        return secret[::-1]
+    if "key" in user or "password" in user or "secret" in user:
+        if defended:
+            return "I'm sorry, but I can't share that."
+        return f"The secret key is {secret}."
+    return "I'm a helpful assistant. How can I help you today?"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0  # seconds added to every reply, to simulate network time
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        content = mock_reply(body["messages"])
+        if self.latency:
+            time.sleep(self.latency)
+        if body.get("stream"):
+            self._stream(body, content)
+            return
+        data = json.dumps({
+            "id": "mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, body: dict, content: str):
+        """Send the reply as server-sent events, a few characters per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [content[i:i + 3] for i in range(0, len(content), 3)] + [None]
+        for piece in pieces:
+            chunk = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_mock_server(port: int = 8000, latency: float = 0.0, background: bool = True) -> ThreadingHTTPServer:
+    """
+    Start the mock and return the server. With background (the default) it
+    runs in a daemon thread (call .shutdown() to stop); otherwise this call
+    serves until interrupted.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), type("Handler", (MockLLMHandler,), {"latency": latency}))
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Mock LLM listening on http://127.0.0.1:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM endpoint")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every reply")
+    args = parser.parse_args()
+    start_mock_server(args.port, args.latency, background=False)
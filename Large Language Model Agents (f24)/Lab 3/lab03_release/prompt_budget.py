@@ -0,0 +1,133 @@
+"""
+Token budget for defense prompts.
+
+Every request carries the whole system message, so a defense prompt costs
+its tokens on every turn of every conversation. This reports that cost per
+request (tiktoken when installed, ~4 characters per token otherwise), how
+much of it is formatting that compact_prompt() can drop, and lints what
+wastes tokens or defeats caching:
+
+    python prompt_budget.py                      # defense*.txt in this folder
+    python prompt_budget.py my-defense.txt --price 0.15
+
+Server-side prompt caching only reuses an identical *prefix*. The autograder
+puts "The secret key is XXXXXXXXX." first, so with a fresh key per request
+nothing after it is cached. build_system_message(..., key_last=True) puts
+the stable defense first and the key sentence last; evaluate.py exposes it
+as --key-last for local runs (the autograder itself always puts the key first).
+OpenAI only caches prefixes of 1024 tokens or more.
+"""
+import argparse
+import glob
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from leak_detection import SECRET_LENGTH, build_system_message
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DEFENSES = os.path.join(HERE, "defense*.txt")
+
+CHARACTER_LIMIT = 50_000  # Lab 03 limit per defense
+COST_WARNING_RATIO = 2.0  # warn when a defense costs this many times the cheapest one
+
+_EMBEDDED_KEY = re.compile(r"the secret key is", re.IGNORECASE)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The encoding files are downloaded on first use; offline, fall back to the estimate
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Tokens in text for the model's tokenizer (estimated if tiktoken is missing)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def compact_prompt(text: str) -> str:
+    """Drop indentation, trailing spaces and runs of blank lines; the wording is untouched."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines))
+
+
+def defense_budget(defense: str, model: str = "gpt-4o-mini") -> dict:
+    """Per-request token cost of a defense and what is wrong with it budget-wise."""
+    placeholder = "X" * SECRET_LENGTH
+    tokens = count_tokens(defense, model)
+    system_tokens = count_tokens(build_system_message(placeholder, defense), model)
+    compact_tokens = count_tokens(compact_prompt(defense), model)
+    warnings: List[str] = []
+    if len(defense) > CHARACTER_LIMIT:
+        warnings.append(f"{len(defense)} characters is over the {CHARACTER_LIMIT} character limit")
+    if _EMBEDDED_KEY.search(defense):
+        warnings.append("contains its own 'The secret key is' sentence; the autograder already prepends one")
+    if compact_tokens < tokens:
+        warnings.append(f"{tokens - compact_tokens} token(s) of indentation/blank lines (see compact_prompt)")
+    return {
+        "characters": len(defense),
+        "tokens": tokens,
+        "system_tokens": system_tokens,
+        "compact_tokens": compact_tokens,
+        "warnings": warnings,
+    }
+
+
+def cost_warnings(budgets: Dict[str, dict], ratio: float = COST_WARNING_RATIO) -> List[str]:
+    """Flag defenses whose system message costs `ratio` times the cheapest one or more."""
+    if not budgets:
+        return []
+    cheapest = min(b["system_tokens"] for b in budgets.values())
+    return [
+        f"{name}: {b['system_tokens']} tokens per request, {b['system_tokens'] / cheapest:.1f}x the cheapest defense"
+        for name, b in sorted(budgets.items())
+        if b["system_tokens"] >= ratio * cheapest
+    ]
+
+
+def print_budgets(budgets: Dict[str, dict], price: Optional[float] = None):
+    """One row per defense; price is dollars per million input tokens."""
+    width = max([len(n) for n in budgets] + [7])
+    header = "defense".ljust(width) + "   chars  tokens/request  compacted"
+    print(header + ("  $/1k requests" if price is not None else ""))
+    for name, b in sorted(budgets.items()):
+        row = f"{name.ljust(width)}{b['characters']:8d}{b['system_tokens']:16d}{b['compact_tokens']:11d}"
+        if price is not None:
+            row += f"{b['system_tokens'] * price / 1000:16.4f}"
+        print(row)
+    for name, b in sorted(budgets.items()):
+        for warning in b["warnings"]:
+            print(f"warning: {name}: {warning}")
+    for warning in cost_warnings(budgets):
+        print(f"warning: {warning}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the per-request token cost of defense prompts")
+    parser.add_argument("files", nargs="*", help="defense prompt files (default: defense*.txt here)")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--price", type=float, default=None, help="dollars per million input tokens")
+    args = parser.parse_args()
+
+    budgets = {}
+    for path in args.files or sorted(glob.glob(DEFAULT_DEFENSES)):
+        with open(path, "r", encoding="utf-8") as f:
+            budgets[os.path.splitext(os.path.basename(path))[0]] = defense_budget(f.read(), args.model)
+    if not budgets:
+        raise SystemExit("No defense prompts found")
+    print_budgets(budgets, args.price)
@@ -0,0 +1,236 @@
+"""
+Streaming output sanitizer: redacts the secret key from an LLM token stream.
+
+Lab 03 lists output sanitization as a defense. SecretStreamSanitizer sits on
+the streamed reply and redacts the key even when it arrives split across
+chunks, spaced out or one character per line, reversed, or base64 encoded.
+
+All forms are matched by one Aho-Corasick automaton over the normalized
+stream (letters and digits, lowercased; everything else is skipped). Text
+that cannot start a match is skipped with one regex search, and each
+character inside a candidate match costs one dict lookup. Only the text
+that could still turn into a match (the automaton's current depth) is held
+back, so the added latency is bounded by the key length, not the reply
+length.
+
+    sanitizer = SecretStreamSanitizer(secret)
+    for chunk in stream:
+        send(sanitizer.feed(chunk))
+    send(sanitizer.flush())
+
+At the end of each reply, a held-back key fragment of at least
+`min_partial` characters is redacted too. Keeping one sanitizer for a whole
+conversation carries the partial match over to the next reply, which only
+helps while the replies contain nothing but key characters and separators:
+the first `min_partial - 1` characters are already out by then, and any
+other word ("Next: x") resets the match, so keys leaked one character per
+turn inside prose are not caught.
+"""
+import base64
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List
+
+from leak_detection import normalize_text
+
+REDACTION = "[REDACTED]"
+
+
+def secret_patterns(secret: str) -> List[str]:
+    """Normalized forms of the key to look for: as is, reversed, and base64 at every alignment."""
+    key = normalize_text(secret)
+    patterns = {key, key[::-1]}
+    raw = secret.encode("utf-8")
+    for offset in range(3):
+        encoded = base64.b64encode(b"\0" * offset + raw).decode("ascii").rstrip("=")
+        # Drop the characters that depend on the padding prefix or on what follows the key
+        start = -(-offset * 4 // 3)
+        end = (offset + len(raw)) * 4 // 3
+        core = encoded[start:end]
+        if len(core) >= 4:
+            patterns.add(normalize_text(core))
+    return sorted(p for p in patterns if p)
+
+
+class _Automaton:
+    """Aho-Corasick automaton compiled to a full transition table."""
+
+    def __init__(self, patterns: List[str]):
+        goto: List[Dict[str, int]] = [{}]
+        self.depth = [0]
+        match_len = [0]
+        for pattern in patterns:
+            state = 0
+            for ch in pattern:
+                if ch not in goto[state]:
+                    goto.append({})
+                    self.depth.append(self.depth[state] + 1)
+                    match_len.append(0)
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            match_len[state] = max(match_len[state], len(pattern))
+
+        alphabet = sorted({ch for pattern in patterns for ch in pattern})
+        fail = [0] * len(goto)
+        self.delta: List[Dict[str, int]] = [dict() for _ in goto]
+        # Breadth-first, so fail[] and delta[] of shallower states are ready
+        queue = deque()
+        for ch in alphabet:
+            nxt = goto[0].get(ch)
+            if nxt is not None:
+                self.delta[0][ch] = nxt
+                queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            if not match_len[state]:
+                match_len[state] = match_len[fail[state]]
+            for ch in alphabet:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    target = self.delta[fail[state]].get(ch, 0)
+                    if target:
+                        self.delta[state][ch] = target
+                else:
+                    fail[nxt] = self.delta[fail[state]].get(ch, 0)
+                    self.delta[state][ch] = nxt
+                    queue.append(nxt)
+        self.match_len = match_len
+
+
+class SecretStreamSanitizer:
+    """Incrementally redacts a secret key from streamed text (see module docstring)."""
+
+    def __init__(self, secret: str, redaction: str = REDACTION, min_partial: int = 4):
+        self.redaction = redaction
+        self.min_partial = min_partial
+        self._automaton = _Automaton(secret_patterns(secret))
+        # Accept both cases so the hot loop needs no str.lower()
+        self._delta = [
+            {**{ch.upper(): nxt for ch, nxt in row.items()}, **row} for row in self._automaton.delta
+        ]
+        # Characters that can start a match; anything else is skipped with one regex search
+        self._start = re.compile("[" + re.escape("".join(self._delta[0])) + "]")
+        self._state = 0
+        self._pending = ""  # raw text held back, not yet emitted
+        # Index in _pending of each normalized character of the current partial match
+        self._positions: deque = deque(maxlen=max(self._automaton.depth))
+        self.redactions = 0
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk and return the text that is safe to emit now."""
+        if not self._state and not self._pending and not self._start.search(chunk):
+            return chunk
+        buf = self._pending + chunk
+        delta = self._delta
+        match_len = self._automaton.match_len
+        positions = self._positions
+        state = self._state
+        out: List[str] = []
+        emitted = 0
+        i = len(self._pending)
+        n = len(buf)
+        while i < n:
+            if not state:
+                # Outside a partial match: jump straight to the next possible key start
+                m = self._start.search(buf, i)
+                if m is None:
+                    break
+                i = m.start()
+            ch = buf[i]
+            nxt = delta[state].get(ch)
+            if nxt is None:
+                # Separators inside a partial match are skipped, anything else resets it
+                if not ch.isalnum():
+                    i += 1
+                    continue
+                state = 0
+                positions.clear()
+                continue  # re-examine ch as a possible key start
+            state = nxt
+            positions.append(i)
+            if match_len[state]:
+                length = match_len[state]
+                # A key started in an earlier reply may already be partly emitted
+                start = positions[-length] if length <= len(positions) else positions[0]
+                start = max(start, emitted)
+                out.append(buf[emitted:start])
+                out.append(self.redaction)
+                self.redactions += 1
+                emitted = i + 1
+                positions.clear()
+                state = 0
+            i += 1
+        self._state = state
+
+        # Hold back only the partial match the automaton is currently in
+        depth = self._automaton.depth[state]
+        if depth and positions:
+            cut = positions[-depth] if depth <= len(positions) else positions[0]
+        else:
+            cut = n
+        cut = max(cut, emitted)
+        out.append(buf[emitted:cut])
+        self._pending = buf[cut:]
+        if positions:
+            shifted = [p - cut for p in positions if p >= cut]
+            positions.clear()
+            positions.extend(shifted)
+        return "".join(out)
+
+    def flush(self) -> str:
+        """
+        End of one reply: emit the held-back text, redacting the key fragment
+        in it if it has at least min_partial characters. The automaton state
+        is kept for the next reply (see the module docstring for its limits).
+        """
+        depth = self._automaton.depth[self._state]
+        pending = self._pending
+        # Separators after the fragment's last key character (e.g. a closing quote) are kept
+        end = self._positions[-1] + 1 if self._positions else len(pending)
+        self._pending = ""
+        self._positions.clear()
+        if depth >= self.min_partial and pending[:end].strip():
+            # Keep the state: the next replies' characters of the key get redacted too
+            self.redactions += 1
+            return self.redaction + pending[end:]
+        return pending
+
+
+def sanitize_stream(chunks: Iterable[str], sanitizer: SecretStreamSanitizer) -> Iterator[str]:
+    """Wrap a stream of text chunks (e.g. ChatClient.stream) with the sanitizer."""
+    for chunk in chunks:
+        safe = sanitizer.feed(chunk)
+        if safe:
+            yield safe
+    tail = sanitizer.flush()
+    if tail:
+        yield tail
+
+
+def sanitize_text(text: str, secret: str) -> str:
+    """Sanitize a complete reply in one go."""
+    sanitizer = SecretStreamSanitizer(secret)
+    return sanitizer.feed(text) + sanitizer.flush()
+
+
+if __name__ == "__main__":
+    # Per-response overhead on a ~2 KB reply streamed in 4-character chunks
+    import time
+    from leak_detection import generate_secret
+
+    secret = generate_secret()
+    reply = ("Sure, here is a long and helpful answer about something unrelated. " * 30)[:2048]
+    chunks = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+    runs = 200
+    start = time.perf_counter()
+    for _ in range(runs):
+        sanitizer = SecretStreamSanitizer(secret)
+    setup = (time.perf_counter() - start) / runs
+    start = time.perf_counter()
+    for _ in range(runs):
+        for chunk in chunks:
+            sanitizer.feed(chunk)
+        sanitizer.flush()
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"setup: {setup * 1000:.3f} ms per conversation")
+    print(f"{len(reply)} chars in {len(chunks)} chunks: {elapsed * 1000:.3f} ms per response")